@@ -1,16 +1,56 @@
 import os
+import sys
+import asyncio
+import errno
 import json
 import shutil
 import csv
+import posixpath
+import tarfile
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import cover_thumbnails
+import folder_match
+from file_utils import file_sha256, EXPORT_FILE_MODE
+
+try:
+    import orjson
+except ImportError:  # optional faster JSON encoder for enriched metadata.json
+    orjson = None
 
 # Define paths for CSV files
 CSV_DB_PATH = os.environ.get("ABS_CSV_DB_PATH", "/abs-data/csv_db")
 LIBRARIES_CSV = os.path.join(CSV_DB_PATH, "libraries.csv")
 LIBRARY_ITEMS_CSV = os.path.join(CSV_DB_PATH, "libraryItems.csv")
 
+# Optional path to the Audiobookshelf absdatabase.sqlite. When set, it is queried
+# directly (read-only) instead of the CSV dumps in ABS_CSV_DB_PATH.
+SQLITE_DB_PATH = os.environ.get("ABS_SQLITE_DB_PATH", "")
+
 # ABS_MEDIA_ROOT is now the base path where actual audiobook folders (named by ID) reside
 ABS_MEDIA_ROOT = os.environ.get("ABS_MEDIA_ROOT", "/media/Audiobooks")
 
+# Number of items exported concurrently. Copies are I/O bound, so more workers
+# than CPU cores helps on network-backed volumes.
+EXPORT_WORKERS = int(os.environ.get("ABS_EXPORT_WORKERS", "1"))
+
+# Staged export pipeline (scan -> create folders -> copy, see export_items):
+# off by default; the copy stage uses ABS_EXPORT_WORKERS threads, the other
+# stages their own limits, with at most ABS_EXPORT_PIPELINE_QUEUE items waiting
+# between two stages.
+EXPORT_PIPELINE = os.environ.get("ABS_EXPORT_PIPELINE", "0").lower() in ("1", "true", "yes")
+PIPELINE_SCAN_WORKERS = int(os.environ.get("ABS_EXPORT_SCAN_WORKERS", "4"))
+PIPELINE_MKDIR_WORKERS = int(os.environ.get("ABS_EXPORT_MKDIR_WORKERS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("ABS_EXPORT_PIPELINE_QUEUE", "256"))
+
 # Helper function to read a CSV file into a list of dictionaries
 def read_csv_to_dicts(filepath):
     data = []
@@ -26,145 +66,1241 @@ def read_csv_to_dicts(filepath):
         print(f"Błąd odczytu pliku CSV '{filepath}': {e}")
     return data
 
+# Columns projected from libraryItems.csv, in the order of the item tuples
+ITEM_COLUMNS = ('id', 'relPath', 'title', 'authorNamesFirstLast')
+
+def iter_library_items(filepath, lib_id=None):
+    """Streams libraryItems.csv and yields (libraryId, (id, relPath, title, authorNamesFirstLast))
+    for non-missing books, optionally only for a single library ID.
+    Rows are filtered while reading and only the used columns are kept, so
+    non-matching rows are never materialized."""
+    if not os.path.exists(filepath):
+        print(f"Błąd: Plik CSV nie istnieje: {filepath}")
+        return
+    try:
+        with open(filepath, mode='r', encoding='utf-8', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = {name: index for index, name in enumerate(header)}
+            try:
+                lib_col = columns['libraryId']
+                media_col = columns['mediaType']
+                missing_col = columns['isMissing']
+            except KeyError as e:
+                print(f"Błąd: Brak kolumny {e} w pliku CSV '{filepath}'")
+                return
+            projected = [columns.get(name) for name in ITEM_COLUMNS]
+            width = max(c for c in projected + [lib_col, media_col, missing_col] if c is not None) + 1
+            wanted_lib = None if lib_id is None else str(lib_id)
+            not_missing = ('0', 'false', 'False')
+
+            for row in reader:
+                if len(row) < width:
+                    row = row + [None] * (width - len(row))
+                if row[media_col] != 'book' or row[missing_col] not in not_missing:
+                    continue
+                row_lib = row[lib_col]
+                if wanted_lib is not None and row_lib != wanted_lib:
+                    continue
+                yield row_lib, tuple(None if c is None else row[c] for c in projected)
+    except Exception as e:
+        print(f"Błąd odczytu pliku CSV '{filepath}': {e}")
+
+class Catalog:
+    """Process-wide, in-memory index of libraries.csv and libraryItems.csv.
+
+    Each CSV is parsed once and re-parsed only when its mtime or size changes.
+    Items are kept grouped by libraryId as compact tuples
+    (id, relPath, title, authorNamesFirstLast), so lookups by library name,
+    library ID and item ID are dictionary hits."""
+
+    def __init__(self, libraries_csv, library_items_csv):
+        self.libraries_csv = libraries_csv
+        self.library_items_csv = library_items_csv
+        self._lock = threading.Lock()
+        self._libraries_sig = None
+        self._items_sig = None
+        self._library_names = []
+        self._library_ids_by_name = {}
+        self._items_by_library = {}
+        self._items_by_id = {}
+        self.version = 0
+
+    @staticmethod
+    def _file_signature(filepath):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load_libraries(self):
+        names = []
+        ids_by_name = {}
+        for lib in read_csv_to_dicts(self.libraries_csv):
+            if 'name' not in lib:
+                continue
+            names.append(lib['name'])
+            # First occurrence wins, matching the previous linear scan.
+            ids_by_name.setdefault(lib['name'], lib.get('id'))
+        self._library_names = names
+        self._library_ids_by_name = ids_by_name
+
+    def _load_items(self):
+        items_by_library = {}
+        items_by_id = {}
+        for lib_id, entry in iter_library_items(self.library_items_csv):
+            items_by_library.setdefault(lib_id, []).append(entry)
+            items_by_id[str(entry[0])] = (lib_id, entry)
+        self._items_by_library = items_by_library
+        self._items_by_id = items_by_id
+
+    def refresh(self):
+        """Re-parses any CSV whose mtime/size changed since the last load."""
+        libraries_sig = self._file_signature(self.libraries_csv)
+        items_sig = self._file_signature(self.library_items_csv)
+        if libraries_sig == self._libraries_sig and items_sig == self._items_sig \
+                and self.version:
+            return
+        with self._lock, metrics.catalog_load_seconds.time():
+            changed = False
+            if libraries_sig != self._libraries_sig or not self.version:
+                self._load_libraries()
+                self._libraries_sig = libraries_sig
+                changed = True
+            if items_sig != self._items_sig or not self.version:
+                self._load_items()
+                self._items_sig = items_sig
+                changed = True
+            if changed:
+                self.version += 1
+
+    @property
+    def signature(self):
+        """mtime/size of the CSV files as loaded; identical in every process
+        that reads the same files (unlike version)."""
+        self.refresh()
+        return [self._libraries_sig, self._items_sig]
+
+    @property
+    def modified_at(self):
+        """Newest modification time (seconds) of the loaded CSV files."""
+        return _newest_mtime(self.signature)
+
+    def library_names(self):
+        self.refresh()
+        return list(self._library_names)
+
+    def library_id(self, name):
+        self.refresh()
+        return self._library_ids_by_name.get(name)
+
+    def items(self, lib_id):
+        self.refresh()
+        return list(self._items_by_library.get(str(lib_id), ()))
+
+    def item(self, item_id):
+        """Returns (libraryId, (id, relPath, title, author)) or None."""
+        self.refresh()
+        return self._items_by_id.get(str(item_id))
+
+    def iter_items(self):
+        """Yields (libraryId, (id, relPath, title, author)) for every item."""
+        self.refresh()
+        return iter(list(self._items_by_id.values()))
+
+
+def _newest_mtime(signatures):
+    """Newest mtime in seconds among (mtime_ns, size) file signatures (None = missing)."""
+    return max((sig[0] for sig in signatures if sig is not None), default=0) / 1e9
+
+class SqliteCatalog:
+    """Catalog backed directly by the Audiobookshelf SQLite database.
+
+    The database is opened read-only (mode=ro, not immutable: ABS runs in WAL
+    mode and recent changes live in the -wal file until a checkpoint), so every
+    lookup is an indexed query. Connections are per thread and reopened when
+    the mtime or size of the database or its -wal file changes."""
+
+    _ITEM_FILTER = "mediaType = 'book' AND isMissing = 0"
+    # NULL columns read as '' like empty CSV cells (ABS leaves authorNamesFirstLast
+    # NULL for books without authors)
+    _ITEM_COLUMNS = "COALESCE(relPath, ''), COALESCE(title, ''), COALESCE(authorNamesFirstLast, '')"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sig = None
+        self.version = 0
+
+    def refresh(self):
+        sig = (Catalog._file_signature(self.db_path),
+               Catalog._file_signature(self.db_path + "-wal"))
+        if sig != self._sig or not self.version:
+            with self._lock:
+                if sig != self._sig or not self.version:
+                    self._sig = sig
+                    self.version += 1
+
+    @property
+    def signature(self):
+        """mtime/size of the database and its -wal file (see Catalog.signature)."""
+        self.refresh()
+        return list(self._sig)
+
+    @property
+    def modified_at(self):
+        return _newest_mtime(self.signature)
+
+    def _connection(self):
+        self.refresh()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.version == self.version:
+            return conn
+        if conn is not None:
+            conn.close()
+        uri = "file:" + quote(os.path.abspath(self.db_path)) + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        self._local.conn = conn
+        self._local.version = self.version
+        return conn
+
+    def _query(self, sql, params=()):
+        if not os.path.exists(self.db_path):
+            print(f"Błąd: Plik bazy danych nie istnieje: {self.db_path}")
+            return []
+        try:
+            return self._connection().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Błąd odczytu bazy danych '{self.db_path}': {e}")
+            return []
+
+    def library_names(self):
+        return [name for (name,) in self._query("SELECT name FROM libraries WHERE name IS NOT NULL ORDER BY rowid")]
+
+    def library_id(self, name):
+        rows = self._query("SELECT id FROM libraries WHERE name = ? LIMIT 1", (name,))
+        return rows[0][0] if rows else None
+
+    def items(self, lib_id):
+        return self._query(
+            f"SELECT id, {self._ITEM_COLUMNS} FROM libraryItems "
+            f"WHERE libraryId = ? AND {self._ITEM_FILTER} ORDER BY rowid", (str(lib_id),))
+
+    def item(self, item_id):
+        rows = self._query(
+            f"SELECT libraryId, id, {self._ITEM_COLUMNS} FROM libraryItems "
+            f"WHERE id = ? AND {self._ITEM_FILTER}", (str(item_id),))
+        if not rows:
+            return None
+        return rows[0][0], tuple(rows[0][1:])
+
+    def iter_items(self):
+        rows = self._query(
+            f"SELECT libraryId, id, {self._ITEM_COLUMNS} FROM libraryItems "
+            f"WHERE {self._ITEM_FILTER} ORDER BY rowid")
+        return ((row[0], tuple(row[1:])) for row in rows)
+
+
+if SQLITE_DB_PATH:
+    catalog = SqliteCatalog(SQLITE_DB_PATH)
+else:
+    catalog = Catalog(LIBRARIES_CSV, LIBRARY_ITEMS_CSV)
+
 def list_library_names():
-    """Reads libraries from CSV and returns their names."""
-    libraries = read_csv_to_dicts(LIBRARIES_CSV)
-    return [lib['name'] for lib in libraries if 'name' in lib]
+    """Returns library names from the catalog."""
+    return catalog.library_names()
 
 def get_library_id_by_name(name):
-    """Reads libraries from CSV and returns ID for a given name."""
-    libraries = read_csv_to_dicts(LIBRARIES_CSV)
-    for lib in libraries:
-        if lib.get('name') == name:
-            return lib.get('id')
-    return None
+    """Returns library ID for a given name from the catalog."""
+    return catalog.library_id(name)
 
 def get_items_by_library(lib_id):
-    """Reads library items from CSV for a given library ID.
-    Only extracts ID, path, title, authorNamesFirstLast for display and path construction."""
-    all_items = read_csv_to_dicts(LIBRARY_ITEMS_CSV)
-    items_for_lib = []
-    for item in all_items:
-        if (item.get('libraryId') == str(lib_id) and
-            item.get('mediaType') == 'book' and
-            item.get('isMissing') in ['0', 'false', 'False', False]):
-            
-            # Zmieniamy 'relPath' na 'path' zgodnie z Twoim życzeniem
-            items_for_lib.append((
-                item.get('id'),
-                item.get('relPath'), # Tutaj wciąż czytamy 'relPath' z CSV, bo tak się nazywa kolumna.
-                                     # Ale dalej w kodzie będziemy to nazywać 'path'.
-                item.get('title'),
-                item.get('authorNamesFirstLast')
-            ))
-    return items_for_lib
+    """Returns library items for a given library ID from the catalog.
+    Each item is a tuple (id, relPath, title, authorNamesFirstLast)."""
+    return catalog.items(lib_id)
 
 def get_source_item_path(item_id):
     """Constructs the expected source path for an item based on its ID."""
     return os.path.join(ABS_MEDIA_ROOT, str(item_id))
 
-def copy_and_write_metadata(item_id, export_base_path, path, title, author):
-    """Copies metadata.json and cover.jpg from ABS_MEDIA_ROOT/item_id to export_base_path/path, IF THEY EXIST.
-    Does NOT create destination folder if nothing is to be copied."""
-    
+# Files looked up in each ABS_MEDIA_ROOT/<item id>/ folder
+MEDIA_FILES = ("metadata.json", "cover.jpg")
+
+# Seconds a scan of ABS_MEDIA_ROOT is reused before the next rescan
+MEDIA_SCAN_TTL = float(os.environ.get("ABS_MEDIA_SCAN_TTL", "60"))
+
+class MediaIndex:
+    """In-memory map of ABS_MEDIA_ROOT: item id -> {filename: (size, mtime_ns)}
+    for the files in MEDIA_FILES. Built with os.scandir (item folders are
+    listed concurrently) and reused for MEDIA_SCAN_TTL seconds, so the UI
+    doesn't probe the media root once per listed item.
+
+    The cached snapshot may be up to ttl seconds old, so exports don't use it:
+    they list the folders of the selected items afresh with scan_items()."""
+
+    def __init__(self, root=None, ttl=MEDIA_SCAN_TTL):
+        self.root = root  # None follows ABS_MEDIA_ROOT
+        self.ttl = ttl
+        self._snapshot = None
+        self._scanned_at = 0.0
+        # Incremented by every scan; updated_at is the wall-clock time of the last one
+        self.generation = 0
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+        self._rescanning = False
+        self._summaries = {}
+
+    @staticmethod
+    def _scan_item_folder(path):
+        files = {}
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name in MEDIA_FILES and entry.is_file():
+                        st = entry.stat()
+                        files[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+        return files
+
+    def scan(self, workers=None):
+        """Rescans the media root and returns the new snapshot."""
+        root = self.root or ABS_MEDIA_ROOT
+        try:
+            with os.scandir(root) as entries:
+                folders = [(entry.name, entry.path) for entry in entries if entry.is_dir()]
+        except OSError as e:
+            print(f"Błąd odczytu katalogu mediów '{root}': {e}")
+            folders = []
+        with ThreadPoolExecutor(max_workers=max(1, workers or EXPORT_WORKERS)) as pool:
+            listings = pool.map(self._scan_item_folder, [path for _, path in folders])
+            snapshot = {name: files for (name, _), files in zip(folders, listings)}
+        with self._lock:
+            self._snapshot = snapshot
+            self._scanned_at = time.monotonic()
+            self.generation += 1
+            self.updated_at = time.time()
+            # Summaries refer to the previous snapshot; don't keep it alive
+            self._summaries = {}
+        return snapshot
+
+    def scan_items(self, item_ids, workers=None):
+        """Lists the folders of just the given items (concurrently) and returns
+        {item id: {filename: (size, mtime_ns)}}, bypassing the cached snapshot."""
+        root = self.root or ABS_MEDIA_ROOT
+        item_ids = [str(item_id) for item_id in dict.fromkeys(item_ids)]
+        paths = [os.path.join(root, item_id) for item_id in item_ids]
+        if len(paths) <= 1:
+            return dict(zip(item_ids, map(self._scan_item_folder, paths)))
+        with ThreadPoolExecutor(max_workers=max(1, min(len(paths), workers or EXPORT_WORKERS))) as pool:
+            return dict(zip(item_ids, pool.map(self._scan_item_folder, paths)))
+
+    def is_fresh(self):
+        return self._snapshot is not None and time.monotonic() - self._scanned_at < self.ttl
+
+    def snapshot(self, workers=None):
+        """Returns the current snapshot, rescanning if it is older than ttl."""
+        if self.is_fresh():
+            return self._snapshot
+        return self.scan(workers)
+
+    def cached(self, workers=None):
+        """Returns the last snapshot without waiting for a rescan: once it has
+        expired it is still returned while a background thread rescans. Only
+        the very first call scans synchronously."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.snapshot(workers)
+        if not self.is_fresh():
+            self._rescan_in_background(workers)
+        return snapshot
+
+    def _rescan_in_background(self, workers=None):
+        with self._lock:
+            if self._rescanning:
+                return
+            self._rescanning = True
+
+        def rescan():
+            try:
+                self.scan(workers)
+            finally:
+                self._rescanning = False
+
+        threading.Thread(target=rescan, name="media-rescan", daemon=True).start()
+
+    def summary(self, key, item_ids, snapshot):
+        """Returns (digest, newest mtime in seconds) of the snapshot entries of
+        item_ids, cached per key and scan. The digest only depends on which
+        files exist, so it stays the same across rescans and processes while
+        the media root doesn't change."""
+        cached = self._summaries.get(key)
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+        digest = hashlib.sha1()
+        newest = 0
+        for item_id in item_ids:
+            files = snapshot.get(str(item_id), {})
+            digest.update(f"{item_id}\0{','.join(sorted(files))}\n".encode('utf-8'))
+            for _, mtime_ns in files.values():
+                newest = max(newest, mtime_ns)
+        result = (digest.hexdigest(), newest / 1e9)
+        self._summaries[key] = (snapshot, result)
+        return result
+
+    def get(self, item_id):
+        """Returns {filename: (size, mtime_ns)} for an item (empty if its folder has none)."""
+        return self.snapshot().get(str(item_id), {})
+
+
+media_index = MediaIndex()
+
+# How files are copied: "auto" tries reflink, copy_file_range and sendfile before
+# a buffered copy; "hardlink" links instead of copying when source and destination
+# share a filesystem (falling back to "auto"); other values force one method.
+COPY_STRATEGY = os.environ.get("ABS_COPY_STRATEGY", "auto")
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Linux FICLONE ioctl (_IOW(0x94, 9, int)): share extents on btrfs/XFS/bcachefs
+_FICLONE = 0x40049409
+
+# Kernel copy methods that reported "not supported", per destination device
+# (st_dev); skipped from then on for copies onto that filesystem
+_unsupported_copy_methods = {}
+
+def _copy_reflink(src_fd, dst_fd, size):
+    import fcntl
+    fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+
+def _short_copy(method, offset, size):
+    """Error for a kernel copy that returned 0 before size bytes. At offset 0 the
+    source doesn't support the method (some FUSE/overlay filesystems), later the
+    file shrank mid-copy; either way copy_file falls back to the next method."""
+    if offset == 0:
+        return OSError(errno.EIO, f"{method} nie skopiował żadnych danych")
+    return OSError(errno.EIO, f"{method} przerwany po {offset} z {size} bajtów")
+
+def _copy_file_range(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+        if copied == 0:
+            raise _short_copy("copy_file_range", offset, size)
+        offset += copied
+
+def _copy_sendfile(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            raise _short_copy("sendfile", offset, size)
+        offset += sent
+
+def _copy_buffered(src_fd, dst_fd, size):
+    while True:
+        chunk = os.read(src_fd, COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+_COPY_METHODS = {
+    "reflink": _copy_reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _copy_sendfile,
+    "buffered": _copy_buffered,
+}
+
+def _available_copy_methods(dev):
+    methods = []
+    if sys.platform.startswith("linux"):
+        methods.append("reflink")
+    if hasattr(os, "copy_file_range"):
+        methods.append("copy_file_range")
+    if hasattr(os, "sendfile"):
+        methods.append("sendfile")
+    unsupported = _unsupported_copy_methods.get(dev, ())
+    return [m for m in methods if m not in unsupported] + ["buffered"]
+
+def _same_file(src, dst):
+    try:
+        return os.path.samefile(src, dst)
+    except OSError:
+        return False
+
+def copy_file(src, dst, strategy=None):
+    """Copies file contents from src to dst (no permission bits) using the fastest
+    available kernel path, falling back to a buffered copy. Returns the name of
+    the method used. Raises shutil.SameFileError like shutil.copy.
+
+    The copy is written to a temp file next to dst and renamed over it: an
+    existing dst may be a hard link or symlink to a shared file (.cover_store,
+    .cover_cache or, with "hardlink", the source), which must not be written through."""
+    strategy = strategy or COPY_STRATEGY
+    if _same_file(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+
+    if strategy == "hardlink":
+        try:
+            try:
+                os.link(src, dst)
+            except FileExistsError:
+                os.unlink(dst)
+                os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            strategy = "auto"
+
+    if strategy != "auto" and strategy not in _COPY_METHODS:
+        raise ValueError(f"Nieznana metoda kopiowania: {strategy}")
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst) or ".", prefix=".copy-", suffix=".tmp")
+    try:
+        with open(src, 'rb') as fsrc, os.fdopen(fd, 'wb') as fdst:
+            # mkstemp creates 0600; give the copy the mode open() would
+            os.fchmod(fdst.fileno(), EXPORT_FILE_MODE)
+            method = _copy_contents(fsrc.fileno(), fdst.fileno(), strategy)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return method
+
+def _copy_contents(src_fd, dst_fd, strategy):
+    """Copies src_fd into the empty dst_fd with the first method of strategy
+    that works; returns its name."""
+    dev = os.fstat(dst_fd).st_dev
+    if strategy == "auto":
+        methods = _available_copy_methods(dev)
+    else:
+        methods = [strategy, "buffered"] if strategy != "buffered" else ["buffered"]
+    size = os.fstat(src_fd).st_size
+    if size == 0:
+        # Empty or size-less (proc-style) source: only reading to EOF is reliable
+        methods = ["buffered"]
+    for method in methods:
+        try:
+            _COPY_METHODS[method](src_fd, dst_fd, size)
+            return method
+        except OSError as e:
+            if method == "buffered":
+                raise
+            if e.errno in (errno.ENOSYS, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTTY):
+                _unsupported_copy_methods.setdefault(dev, set()).add(method)
+            # Start over with the next method
+            os.ftruncate(dst_fd, 0)
+            os.lseek(src_fd, 0, os.SEEK_SET)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+
+# Name of the manifest file kept in the export root by incremental exports
+MANIFEST_NAME = ".abs_export_manifest.json"
+
+# Compare a content hash when size matches but mtime differs (incremental mode)
+INCREMENTAL_VERIFY_HASH = os.environ.get("ABS_EXPORT_VERIFY_HASH", "0") == "1"
+
+@contextmanager
+def _locked_directory(path):
+    """Holds an exclusive flock on a directory, serializing read-modify-write
+    of files in it across threads, jobs and server processes. Without fcntl
+    (non-POSIX) it doesn't lock."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def _try_lock_file(f):
+    """Takes an exclusive flock on an open file without waiting; returns False
+    if another open file holds it. Without fcntl (non-POSIX) it always succeeds."""
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+class ExportManifest:
+    """Records size/mtime (and optionally SHA-256) of every source file copied
+    into an export root, so unchanged files can be skipped on re-export.
+
+    Keys are destination paths relative to the export root. save() merges the
+    entries recorded by this export into the manifest on disk, so concurrent
+    exports into the same root don't drop each other's entries."""
+
+    def __init__(self, export_path, verify_hash=False):
+        self.export_path = export_path
+        self.filepath = os.path.join(export_path, MANIFEST_NAME)
+        self.verify_hash = verify_hash
+        self._entries = {}
+        self._updated = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def _read_entries(self):
+        try:
+            with open(self.filepath, mode='r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get("files", {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Błąd odczytu manifestu eksportu '{self.filepath}': {e}")
+            return {}
+
+    def load(self):
+        self._entries = self._read_entries()
+        return self
+
+    def is_unchanged(self, key, source_path, source_info, dest_path):
+        """True if source_path matches the recorded entry and the destination still exists."""
+        entry = self._entries.get(key)
+        if not entry or entry.get("size") != source_info[0]:
+            return False
+        if not os.path.exists(dest_path):
+            return False
+        if entry.get("mtime_ns") == source_info[1]:
+            return True
+        if self.verify_hash and entry.get("sha256"):
+            try:
+                if file_sha256(source_path) == entry["sha256"]:
+                    self.record(key, source_path, source_info, entry["sha256"])
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def record(self, key, source_path, source_info, sha256=None):
+        entry = {"size": source_info[0], "mtime_ns": source_info[1]}
+        if self.verify_hash:
+            entry["sha256"] = sha256 or file_sha256(source_path)
+        with self._lock:
+            self._entries[key] = entry
+            self._updated[key] = entry
+            self._dirty = True
+
+    def save(self):
+        """Merges this export's entries into the manifest on disk and writes it
+        atomically (unique temp file + rename), under a lock on the export root."""
+        with self._lock:
+            if not self._dirty:
+                return
+            updated = dict(self._updated)
+        tmp_path = None
+        try:
+            with _locked_directory(self.export_path):
+                entries = self._read_entries()
+                entries.update(updated)
+                fd, tmp_path = tempfile.mkstemp(dir=self.export_path, prefix=".abs_export_manifest-",
+                                                suffix=".tmp")
+                with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+                    json.dump({"version": 1, "files": entries}, f)
+                os.replace(tmp_path, self.filepath)
+                tmp_path = None
+        except Exception as e:
+            print(f"Błąd zapisu manifestu eksportu '{self.filepath}': {e}")
+            return
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+        with self._lock:
+            # Entries recorded while saving stay pending for the next save()
+            for key, entry in updated.items():
+                if self._updated.get(key) is entry:
+                    del self._updated[key]
+            self._dirty = bool(self._updated)
+
+# Journal of finished items kept in the export root while an export runs, named
+# by the start of the export's fingerprint so concurrent exports of different
+# items or options into the same root keep separate journals
+JOURNAL_NAME = ".abs_export_journal-{}.jsonl"
+
+# Resume an interrupted export of the same items into the same root from its journal
+EXPORT_JOURNAL = os.environ.get("ABS_EXPORT_JOURNAL", "1") == "1"
+
+# The journal is fsynced after this many items or seconds, whichever comes first
+JOURNAL_SYNC_ITEMS = int(os.environ.get("ABS_EXPORT_JOURNAL_SYNC_ITEMS", "200"))
+JOURNAL_SYNC_SECONDS = float(os.environ.get("ABS_EXPORT_JOURNAL_SYNC_SECONDS", "2"))
+
+class ExportJournal:
+    """Append-only JSON-lines journal of the items an export has finished.
+
+    The first line identifies the export (a fingerprint of its items and
+    options); every further line holds one item's result. Lines are fsynced
+    in batches, so a crash loses at most the last batch, which is simply
+    exported again. The journal is locked while its export runs and removed
+    once the export completes."""
+
+    def __init__(self, export_path, fingerprint):
+        self.filepath = os.path.join(export_path, JOURNAL_NAME.format(fingerprint[:16]))
+        self.fingerprint = fingerprint
+        # item id -> (success, details) of items finished before an interruption
+        self.completed = {}
+        self._valid_size = 0
+        self._file = None
+        self._pending = 0
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Opens and locks the journal and reads the results of an interrupted
+        run of the same export. Raises OSError if a running export (the same
+        items and options, started twice) already holds it."""
+        f = open(self.filepath, 'a+b')
+        try:
+            if not _try_lock_file(f):
+                raise OSError(errno.EBUSY, f"dziennik '{self.filepath}' jest używany przez inny eksport")
+            self._file = f
+            self._load()
+            # Appends go after the valid part; a torn or foreign rest is cut off
+            f.truncate(self._valid_size)
+            if not self._valid_size:
+                f.write(json.dumps({"fingerprint": self.fingerprint, "started_at": time.time()}).encode('utf-8') + b"\n")
+                self._sync()
+        except BaseException:
+            self._file = None
+            f.close()
+            raise
+        return self
+
+    def _load(self):
+        f = self._file
+        try:
+            f.seek(0)
+            header = f.readline()
+            if not header.endswith(b"\n") or json.loads(header).get("fingerprint") != self.fingerprint:
+                return
+            offset = len(header)
+            for line in f:
+                # A torn last line (crash while appending) ends the valid part
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self.completed[str(entry["id"])] = (entry["success"], entry["details"])
+                offset += len(line)
+            self._valid_size = offset
+        except Exception as e:
+            print(f"Błąd odczytu dziennika eksportu '{self.filepath}': {e}")
+            self.completed = {}
+            self._valid_size = 0
+
+    def record(self, item_id, success, details):
+        line = json.dumps({"id": item_id, "success": success, "details": details},
+                          ensure_ascii=False, separators=(",", ":")).encode('utf-8') + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            if self._pending >= JOURNAL_SYNC_ITEMS or time.monotonic() - self._synced_at >= JOURNAL_SYNC_SECONDS:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def close(self, completed):
+        """Syncs and closes the journal; a completed export removes it (while
+        still holding the lock, so a new run of the export starts a new journal)."""
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._sync()
+                if completed:
+                    try:
+                        os.unlink(self.filepath)
+                    except OSError as e:
+                        print(f"Błąd usuwania dziennika eksportu '{self.filepath}': {e}")
+            finally:
+                self._file.close()
+                self._file = None
+
+def _export_fingerprint(items, options):
+    """Identifies an export by its item IDs (in order) and the options affecting its output."""
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8'))
+    for item in items:
+        digest.update(str(item[0]).encode('utf-8') + b"\0")
+    return digest.hexdigest()
+
+# Directory (inside the export root) holding deduplicated cover blobs
+COVER_STORE_NAME = ".cover_store"
+
+# Store each distinct cover once in the export root and link it into item folders
+DEDUPE_COVERS = os.environ.get("ABS_EXPORT_DEDUPE_COVERS", "0") == "1"
+
+class CoverStore:
+    """Content-addressed store of cover files in <export root>/.cover_store.
+
+    Each cover is hashed while it is being copied (one read of the source),
+    kept once per SHA-256 and hard-linked (or symlinked, or as a last resort
+    copied) into the item folder."""
+
+    def __init__(self, export_path):
+        self.root = os.path.join(export_path, COVER_STORE_NAME)
+        self.bytes_saved = 0
+        self.blobs_reused = 0
+        self._lock = threading.Lock()
+
+    def _ingest(self, source_path):
+        """Copies source into the store while hashing it; returns (blob path, size, duplicate)."""
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with open(source_path, 'rb') as fsrc, os.fdopen(fd, 'wb') as ftmp:
+                # Blobs are linked into item folders, so they need the usual mode
+                os.fchmod(ftmp.fileno(), EXPORT_FILE_MODE)
+                for chunk in iter(lambda: fsrc.read(COPY_BUFFER_SIZE), b''):
+                    digest.update(chunk)
+                    ftmp.write(chunk)
+                    size += len(chunk)
+            blob_dir = os.path.join(self.root, digest.hexdigest()[:2])
+            os.makedirs(blob_dir, exist_ok=True)
+            blob_path = os.path.join(blob_dir, digest.hexdigest() + os.path.splitext(source_path)[1])
+            try:
+                # link() fails if the blob exists, which makes the check-and-add atomic
+                os.link(tmp_path, blob_path)
+                duplicate = False
+            except FileExistsError:
+                duplicate = True
+                # Blobs from exports before the mode fix were created 0600
+                os.chmod(blob_path, EXPORT_FILE_MODE)
+        finally:
+            os.unlink(tmp_path)
+        return blob_path, size, duplicate
+
+    def store(self, source_path, dest_path):
+        """Places source_path's content at dest_path via the store.
+        Returns True if an identical blob already existed."""
+        blob_path, size, duplicate = self._ingest(source_path)
+        if _same_file(blob_path, dest_path):
+            raise shutil.SameFileError(f"{blob_path!r} and {dest_path!r} are the same file")
+        if os.path.lexists(dest_path):
+            os.unlink(dest_path)
+        try:
+            os.link(blob_path, dest_path)
+        except OSError:
+            try:
+                os.symlink(os.path.relpath(blob_path, os.path.dirname(dest_path)), dest_path)
+            except OSError:
+                copy_file(blob_path, dest_path)
+        if duplicate:
+            with self._lock:
+                self.bytes_saved += size
+                self.blobs_reused += 1
+        return duplicate
+
+# Write metadata.json enriched with catalog fields instead of copying it verbatim
+ENRICH_METADATA = os.environ.get("ABS_EXPORT_ENRICH_METADATA", "0") == "1"
+
+def _dumps_json(document):
+    """Serializes a metadata document to UTF-8 bytes (orjson if installed)."""
+    if orjson is not None:
+        return orjson.dumps(document, option=orjson.OPT_INDENT_2)
+    return json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8')
+
+def enrich_metadata(document, title, author, path):
+    """Merges catalog fields into a metadata.json document (in place) and returns it.
+    title and authors from the catalog replace the document's; the year and series
+    parsed from the folder name only fill fields the document leaves empty."""
+    if title:
+        document["title"] = title
+    if author:
+        document["authors"] = [name.strip() for name in author.split(',') if name.strip()]
+    folder_name = os.path.basename(str(path or "").rstrip("/\\"))
+    _, _, year = folder_match.parse_folder_name(folder_name)
+    if year and not document.get("publishedYear"):
+        document["publishedYear"] = year
+    series, volume = folder_match.parse_folder_series(folder_name)
+    if series and not document.get("series"):
+        document["series"] = [f"{series} #{volume}" if volume else series]
+    return document
+
+def write_enriched_metadata(source_path, dest_path, title, author, path):
+    """Writes source metadata.json merged with catalog fields to dest_path via a
+    temp file + rename, so an interrupted export never leaves a partial file.
+    Only this one document is in memory. Returns the number of bytes written."""
+    with open(source_path, 'rb') as f:
+        document = json.loads(f.read())
+    if not isinstance(document, dict):
+        raise ValueError("metadata.json nie zawiera obiektu JSON")
+    data = _dumps_json(enrich_metadata(document, title, author, path))
+    dest_dir = os.path.dirname(dest_path)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".metadata-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # mkstemp creates 0600; give it the mode a copied metadata.json gets
+            os.fchmod(f.fileno(), EXPORT_FILE_MODE)
+            f.write(data)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+class ExportContext:
+    """State shared by all items of a single export_items call.
+    media is a MediaIndex snapshot (item id -> {filename: (size, mtime_ns)})
+    or None to stat source files per item. With cover_size covers are resized
+    to fit cover_size px (see cover_thumbnails) if Pillow is installed. With
+    enrich_metadata metadata.json is rewritten with catalog fields."""
+
+    def __init__(self, export_path, incremental=False, verify_hash=None, media=None, copy_strategy=None,
+                 dedupe_covers=False, cover_size=0, enrich_metadata=False):
+        self.export_path = export_path
+        self.enrich_metadata = enrich_metadata
+        self.media = media
+        self.copy_strategy = copy_strategy or COPY_STRATEGY
+        self.cover_store = CoverStore(export_path) if dedupe_covers else None
+        self.thumbnailer = None
+        if cover_size:
+            if cover_thumbnails.available():
+                self.thumbnailer = cover_thumbnails.CoverThumbnailer(export_path, cover_size)
+            else:
+                print("Brak biblioteki Pillow - okładki zostaną skopiowane bez zmniejszania.")
+        self.manifest = None
+        if incremental:
+            if verify_hash is None:
+                verify_hash = INCREMENTAL_VERIFY_HASH
+            self.manifest = ExportManifest(export_path, verify_hash).load()
+
+    def finish(self):
+        if self.manifest is not None:
+            self.manifest.save()
+
+def _source_info(filepath):
+    """Returns (size, mtime_ns) of a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+class _ItemExport:
+    """State of one item passing through the scan, folder and copy stages.
+    result is set to (success, details) as soon as the item is finished."""
+
+    __slots__ = ("item_id", "path", "title", "author", "dest_folder", "details", "to_copy", "result", "started")
+
+    def __init__(self, item_id, path, title=None, author=None):
+        self.item_id = item_id
+        self.path = path
+        self.title = title
+        self.author = author
+        self.dest_folder = None
+        self.details = None
+        self.to_copy = ()
+        self.result = None
+        self.started = time.perf_counter()
+
+def _scan_item(task, export_base_path, context=None):
+    """Scan stage: finds which source files exist and which of them need copying."""
     # Source paths for metadata.json and cover.jpg based on ABS_MEDIA_ROOT and item_id
-    source_item_folder = get_source_item_path(item_id)
-    source_metadata_path = os.path.join(source_item_folder, "metadata.json")
-    source_cover_path = os.path.join(source_item_folder, "cover.jpg")
+    source_item_folder = get_source_item_path(task.item_id)
+    manifest = context.manifest if context is not None else None
 
-    # Check if there's anything to copy BEFORE creating the destination directory
-    has_metadata_source = os.path.exists(source_metadata_path)
-    has_cover_source = os.path.exists(source_cover_path)
+    # Check if there's anything to copy BEFORE creating the destination directory.
+    # The media pre-scan (if any) or a single stat per file tells both existence
+    # and size/mtime for the manifest.
+    media = context.media if context is not None else None
+    scanned = media.get(str(task.item_id), {}) if media is not None else None
+    files = []
+    for kind, filename in (("metadata", "metadata.json"), ("cover", "cover.jpg")):
+        source_path = os.path.join(source_item_folder, filename)
+        source_info = scanned.get(filename) if scanned is not None else _source_info(source_path)
+        files.append((kind, filename, source_path, source_info))
 
-    if not has_metadata_source and not has_cover_source:
-        return False, {
+    if all(source_info is None for _, _, _, source_info in files):
+        task.result = (False, {
             "metadata_status_text": "Brak w źródle", "metadata_class": "missing",
             "cover_status_text": "Brak w źródle", "cover_class": "missing",
             "overall_message": "Brak plików do skopiowania", "overall_class": "skipped"
-        }
+        })
+        return
 
     # Destination folder based on user-provided export_base_path and path from CSV
     # Zmieniamy 'rel_path' na 'path'
-    dest_folder = os.path.join(export_base_path, path)
+    task.dest_folder = os.path.join(export_base_path, task.path)
 
-    # Now, if we have something to copy, ensure destination folder exists
-    if not os.path.isdir(dest_folder):
-        try:
-            os.makedirs(dest_folder, exist_ok=True)
-        except Exception as e:
-            return False, {
-                "metadata_status_text": "N/A", "metadata_class": "error",
-                "cover_status_text": "N/A", "cover_class": "error",
-                "overall_message": f"Błąd tworzenia folderu docelowego: {e}", "overall_class": "error",
-                "metadata_copied": False, # No actual files copied here
-                "cover_copied": False     # No actual files copied here
-            }
-
-    result_details = {
+    task.details = {
         "metadata_status_text": "", "metadata_class": "",
         "cover_status_text": "", "cover_class": "",
         "overall_message": "OK", "overall_class": "success",
         "metadata_copied": False,
         "cover_copied": False
     }
-    overall_success = True
 
-    # --- Attempt to copy metadata.json ---
-    if has_metadata_source:
-        dest_metadata_path = os.path.join(dest_folder, "metadata.json")
-        try:
-            shutil.copy(source_metadata_path, dest_metadata_path)
-            result_details["metadata_status_text"] = "Skopiowano"
-            result_details["metadata_class"] = "copied"
-            result_details["metadata_copied"] = True
-        except shutil.SameFileError:
-            result_details["metadata_status_text"] = "Już istnieje"
-            result_details["metadata_class"] = "exists"
-            result_details["metadata_copied"] = True
-        except Exception as e:
-            result_details["metadata_status_text"] = f"Błąd: {e}"
-            result_details["metadata_class"] = "error"
-            overall_success = False
-    else:
-        result_details["metadata_status_text"] = "Brak w źródle"
-        result_details["metadata_class"] = "missing"
+    to_copy = []
+    for kind, filename, source_path, source_info in files:
+        if source_info is None:
+            task.details[f"{kind}_status_text"] = "Brak w źródle"
+            task.details[f"{kind}_class"] = "missing"
+            continue
+        key = os.path.join(task.path, filename)
+        if kind == "cover" and context is not None and context.thumbnailer is not None:
+            # Resized covers depend on the target size too
+            key += "@" + context.thumbnailer.key
+        elif kind == "metadata" and context is not None and context.enrich_metadata:
+            # Enriched metadata also depends on the catalog fields merged into it
+            fields = hashlib.sha1(f"{task.title}\0{task.author}".encode('utf-8')).hexdigest()[:12]
+            key += "@enriched-" + fields
+        if manifest is not None and manifest.is_unchanged(
+                key, source_path, source_info, os.path.join(task.dest_folder, filename)):
+            task.details[f"{kind}_status_text"] = "Bez zmian"
+            task.details[f"{kind}_class"] = "unchanged"
+            task.details[f"{kind}_unchanged"] = True
+            continue
+        to_copy.append((kind, filename, source_path, source_info, key))
+    task.to_copy = to_copy
+
+def _make_item_folder(task, folders=None):
+    """Folder stage: creates the destination folder if anything is to be copied.
+    folders (a FolderCache) skips folders already created by this export."""
+    if not task.to_copy:
+        return
+    # Now, if we have something to copy, ensure destination folder exists
+    # (makedirs with exist_ok avoids a separate isdir() round-trip)
+    try:
+        with metrics.export_mkdir_seconds.time():
+            if folders is not None:
+                folders.ensure(task.dest_folder)
+            else:
+                os.makedirs(task.dest_folder, exist_ok=True)
+    except Exception as e:
+        task.result = (False, {
+            "metadata_status_text": "N/A", "metadata_class": "error",
+            "cover_status_text": "N/A", "cover_class": "error",
+            "overall_message": f"Błąd tworzenia folderu docelowego: {e}", "overall_class": "error",
+            "metadata_copied": False, # No actual files copied here
+            "cover_copied": False     # No actual files copied here
+        })
+
+def _copy_item_files(task, context=None):
+    """Copy stage: copies the files found by the scan stage and sets the item's overall status."""
+    manifest = context.manifest if context is not None else None
+    result_details = task.details
+    overall_success = True
 
-    # --- Attempt to copy cover.jpg ---
-    if has_cover_source:
-        dest_cover_path = os.path.join(dest_folder, "cover.jpg")
+    # --- Attempt to copy metadata.json and cover.jpg ---
+    for kind, filename, source_path, source_info, key in task.to_copy:
+        dest_path = os.path.join(task.dest_folder, filename)
         try:
-            shutil.copy(source_cover_path, dest_cover_path)
-            result_details["cover_status_text"] = "Skopiowano"
-            result_details["cover_class"] = "copied"
-            result_details["cover_copied"] = True
+            copied_bytes = source_info[0]
+            copy_source = source_path
+            copied_text = "Skopiowano"
+            if kind == "cover" and context is not None and context.thumbnailer is not None:
+                copy_source, resize_status = context.thumbnailer.render(source_path)
+                if resize_status is not None:
+                    copied_bytes = os.path.getsize(copy_source)
+                    copied_text = "Skopiowano (zmniejszona)"
+                    result_details["cover_resize"] = resize_status
+            with metrics.export_copy_seconds.time():
+                if kind == "metadata" and context is not None and context.enrich_metadata:
+                    copied_bytes = write_enriched_metadata(source_path, dest_path, task.title, task.author, task.path)
+                    result_details[f"{kind}_status_text"] = "Zapisano (uzupełniono z katalogu)"
+                elif kind == "cover" and context is not None and context.cover_store is not None:
+                    if context.cover_store.store(copy_source, dest_path):
+                        result_details[f"{kind}_status_text"] = "Skopiowano (powiązano z identyczną okładką)"
+                        result_details["cover_dedupe_saved"] = copied_bytes
+                        copied_bytes = 0
+                    else:
+                        result_details[f"{kind}_status_text"] = copied_text
+                else:
+                    copy_file(copy_source, dest_path, context.copy_strategy if context is not None else None)
+                    result_details[f"{kind}_status_text"] = copied_text
+            result_details[f"{kind}_class"] = "copied"
+            result_details[f"{kind}_copied"] = True
+            result_details[f"{kind}_bytes"] = copied_bytes
+            metrics.export_bytes_total.inc(copied_bytes)
+            metrics.export_files_total.inc()
+            if manifest is not None:
+                manifest.record(key, source_path, source_info)
         except shutil.SameFileError:
-            result_details["cover_status_text"] = "Już istnieje"
-            result_details["cover_class"] = "exists"
-            result_details["cover_copied"] = True
+            result_details[f"{kind}_status_text"] = "Już istnieje"
+            result_details[f"{kind}_class"] = "exists"
+            result_details[f"{kind}_copied"] = True
         except Exception as e:
-            result_details["cover_status_text"] = f"Błąd: {e}"
-            result_details["cover_class"] = "error"
+            result_details[f"{kind}_status_text"] = f"Błąd: {e}"
+            result_details[f"{kind}_class"] = "error"
             overall_success = False
-    else:
-        result_details["cover_status_text"] = "Brak w źródle"
-        result_details["cover_class"] = "missing"
 
     if not overall_success:
         result_details["overall_message"] = "Wystąpiły błędy"
         result_details["overall_class"] = "error"
-    elif not (result_details["metadata_class"] == "copied" or result_details["metadata_class"] == "exists" or \
-              result_details["cover_class"] == "copied" or result_details["cover_class"] == "exists"):
+    elif not any(result_details[f"{kind}_class"] in ("copied", "exists", "unchanged")
+                 for kind in ("metadata", "cover")):
         result_details["overall_message"] = "Brak plików do skopiowania"
         result_details["overall_class"] = "skipped"
         overall_success = False
+    elif not task.to_copy:
+        result_details["overall_message"] = "Bez zmian"
+        result_details["overall_class"] = "unchanged"
+
+    task.result = (overall_success, result_details)
+
+def copy_and_write_metadata(item_id, export_base_path, path, title, author, context=None):
+    """Copies metadata.json and cover.jpg from ABS_MEDIA_ROOT/item_id to export_base_path/path, IF THEY EXIST.
+    Does NOT create destination folder if nothing is to be copied.
+    In incremental mode (context with a manifest) files whose source is unchanged
+    since the last export are skipped and reported with the "unchanged" class."""
+    task = _ItemExport(item_id, path, title, author)
+    _scan_item(task, export_base_path, context)
+    if task.result is None:
+        _make_item_folder(task)
+    if task.result is None:
+        _copy_item_files(task, context)
+    return task.result
+
+class FolderCache:
+    """Set of folders known to exist under an export root, so items sharing a
+    parent (usually the author folder) create it once and then need a single
+    mkdir for their own folder instead of a makedirs walk."""
+
+    def __init__(self, root):
+        # Set membership and add() are atomic, so stage threads can share it
+        self._known = {os.path.normpath(root)}
+
+    def ensure(self, path):
+        path = os.path.normpath(path)
+        if path in self._known:
+            return
+        parent = os.path.dirname(path)
+        if parent and parent != path and parent not in self._known:
+            os.makedirs(parent, exist_ok=True)
+            self._known.add(parent)
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            if not os.path.isdir(path):
+                raise
+        self._known.add(path)
+
+async def _run_stage(inbox, outbox, workers, next_workers, executor, handle):
+    """Runs handle(task) for every task from inbox on executor, with at most
+    `workers` tasks in flight, forwarding unfinished tasks to outbox.
+    None marks the end of the input; the stage then ends the next one."""
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        while True:
+            task = await inbox.get()
+            if task is None:
+                return
+            await loop.run_in_executor(executor, handle, task)
+            if outbox is not None:
+                await outbox.put(task)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if outbox is not None:
+        for _ in range(next_workers):
+            await outbox.put(None)
 
-    return overall_success, result_details
+async def _export_pipeline(items, export_path, context, copy_workers, finish):
+    """Exports items through bounded queues between a scan stage (stat and
+    manifest checks), a folder stage (deduplicated mkdir) and a copy stage,
+    each with its own thread pool, so a slow destination doesn't stall scanning."""
+    scan_workers = max(1, PIPELINE_SCAN_WORKERS)
+    mkdir_workers = max(1, PIPELINE_MKDIR_WORKERS)
+    copy_workers = max(1, copy_workers)
+    folders = FolderCache(export_path)
 
-def export_items(items, export_path):
-    """Exports items to the specified export_path, returning detailed results and counts."""
+    def scan(task):
+        _scan_item(task, export_path, context)
+
+    def make_folder(task):
+        if task.result is None:
+            _make_item_folder(task, folders)
+
+    def copy(task):
+        if task.result is None:
+            _copy_item_files(task, context)
+        finish(task)
+
+    scan_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    mkdir_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    copy_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    tasks = []
+
+    async def feed():
+        for item_id, path, title, author in items:
+            task = _ItemExport(item_id, path, title, author)
+            tasks.append(task)
+            await scan_queue.put(task)
+        for _ in range(scan_workers):
+            await scan_queue.put(None)
+
+    with ThreadPoolExecutor(max_workers=scan_workers, thread_name_prefix="export-scan") as scan_pool, \
+            ThreadPoolExecutor(max_workers=mkdir_workers, thread_name_prefix="export-mkdir") as mkdir_pool, \
+            ThreadPoolExecutor(max_workers=copy_workers, thread_name_prefix="export-copy") as copy_pool:
+        await asyncio.gather(
+            feed(),
+            _run_stage(scan_queue, mkdir_queue, scan_workers, mkdir_workers, scan_pool, scan),
+            _run_stage(mkdir_queue, copy_queue, mkdir_workers, copy_workers, mkdir_pool, make_folder),
+            _run_stage(copy_queue, None, copy_workers, 0, copy_pool, copy),
+        )
+    return [(task.item_id,) + task.result for task in tasks]
+
+def export_items(items, export_path, workers=None, incremental=False, on_result=None,
+                 copy_strategy=None, dedupe_covers=None, pipeline=None, cover_size=None,
+                 enrich_metadata=None, resume=None):
+    """Exports items to the specified export_path, returning detailed results and counts.
+    With workers > 1 items are copied concurrently by a bounded thread pool;
+    results keep the order of items. With incremental=True files unchanged since
+    the previous export into export_path (per its manifest) are skipped.
+    on_result(item_id, success, details), if given, is called as soon as each
+    item finishes (from the worker thread, in completion order).
+    copy_strategy overrides ABS_COPY_STRATEGY (see copy_file). With dedupe_covers
+    (default ABS_EXPORT_DEDUPE_COVERS) identical covers are stored once (see CoverStore).
+    With pipeline (default ABS_EXPORT_PIPELINE) items go through separate scan,
+    folder and copy stages (see _export_pipeline); workers then sizes the copy stage.
+    With cover_size (default ABS_EXPORT_COVER_SIZE, 0 = off) covers larger than
+    cover_size px are exported resized (see cover_thumbnails), with at least
+    ABS_EXPORT_COVER_PROCESSES items in flight. With enrich_metadata
+    (default ABS_EXPORT_ENRICH_METADATA) metadata.json is rewritten with the
+    item's catalog title/authors and folder year/series (see enrich_metadata).
+    With resume (default ABS_EXPORT_JOURNAL) finished items are journaled in the
+    export root, and an interrupted export of the same items with the same
+    options skips the items it finished before; counts cover both runs.
+    Besides the file counts, counts carries a throughput summary: bytes_copied,
+    elapsed_seconds, files_per_second and item_latency_p95_ms."""
     results = []
     metadata_count = 0
     cover_count = 0
+    metadata_unchanged = 0
+    cover_unchanged = 0
+    bytes_copied = 0
+    item_latencies = []
+    started = time.perf_counter()
+    if workers is None:
+        workers = EXPORT_WORKERS
 
     if not os.path.isdir(export_path):
         try:
@@ -182,16 +1318,266 @@ def export_items(items, export_path):
                 "overall_message": f"Błąd: Główny katalog docelowy ('{export_path}') nie istnieje i nie można go utworzyć: {e}", "overall_class": "error",
                 "metadata_copied": False, "cover_copied": False
             }))
-            return results, {"metadata_total": metadata_count, "cover_total": cover_count}
-        
-    # Zmieniamy 'rel_path' na 'path'
-    for item_id, path, title, author in items:
-        success, details = copy_and_write_metadata(item_id, export_path, path, title, author)
+            return results, {"metadata_total": metadata_count, "cover_total": cover_count,
+                             "metadata_unchanged_total": 0, "cover_unchanged_total": 0}
+
+    if dedupe_covers is None:
+        dedupe_covers = DEDUPE_COVERS
+    if cover_size is None:
+        cover_size = cover_thumbnails.COVER_MAX_SIZE
+    if enrich_metadata is None:
+        enrich_metadata = ENRICH_METADATA
+    context = ExportContext(export_path, incremental=incremental,
+                            copy_strategy=copy_strategy, dedupe_covers=dedupe_covers,
+                            cover_size=cover_size, enrich_metadata=enrich_metadata)
+    if context.thumbnailer is not None:
+        # An item's thread waits while its cover is encoded, so fewer threads
+        # than encoding processes would leave some of the processes idle
+        workers = max(workers, cover_thumbnails.COVER_PROCESSES)
+
+    if resume is None:
+        resume = EXPORT_JOURNAL
+    journal = None
+    resumed = {}
+    if resume:
+        fingerprint = _export_fingerprint(items, {
+            "incremental": bool(incremental), "copy_strategy": context.copy_strategy,
+            "dedupe_covers": bool(dedupe_covers), "cover_size": cover_size,
+            "enrich_metadata": bool(enrich_metadata)})
+        try:
+            journal = ExportJournal(export_path, fingerprint).open()
+            resumed = journal.completed
+        except OSError as e:
+            print(f"Błąd otwarcia dziennika eksportu, eksport bez wznawiania: {e}")
+            journal = None
+    if resumed:
+        if on_result is not None:
+            for item_id, _, _, _ in items:
+                if str(item_id) in resumed:
+                    on_result(item_id, *resumed[str(item_id)])
+        pending = [item for item in items if str(item[0]) not in resumed]
+    else:
+        pending = items
+
+    # A concurrent listing of the selected item folders replaces per-item
+    # existence probes. The cached media_index snapshot may be stale, so it is
+    # not trusted for what gets copied.
+    context.media = media_index.scan_items([item[0] for item in pending], workers)
+
+    def finish(task):
+        item_elapsed = time.perf_counter() - task.started
+        item_latencies.append(item_elapsed)
+        metrics.export_item_seconds.observe(item_elapsed)
+        # Failed items are not journaled, so a resumed export retries them
+        if journal is not None and task.result[1].get("overall_class") != "error":
+            journal.record(task.item_id, *task.result)
+        if on_result is not None:
+            on_result(task.item_id, *task.result)
+
+    def export_one(item):
+        # Zmieniamy 'rel_path' na 'path'
+        item_id, path, title, author = item
+        task = _ItemExport(item_id, path, title, author)
+        task.result = copy_and_write_metadata(item_id, export_path, path, title, author, context)
+        finish(task)
+        return (item_id,) + task.result
+
+    if pipeline is None:
+        pipeline = EXPORT_PIPELINE
+    try:
+        if pipeline and pending:
+            item_results = asyncio.run(_export_pipeline(pending, export_path, context, workers, finish))
+        elif workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                item_results = list(pool.map(export_one, pending))
+        else:
+            item_results = list(map(export_one, pending))
+        context.finish()
+    except BaseException:
+        if journal is not None:
+            journal.close(completed=False)
+        raise
+    if journal is not None:
+        journal.close(completed=True)
+
+    files_this_run = sum(int(bool(details.get("metadata_copied"))) + int(bool(details.get("cover_copied")))
+                         for _, _, details in item_results)
+    if resumed:
+        # Back in the order of items, with the results from before the interruption
+        new_results = iter(item_results)
+        item_results = [(item_id,) + resumed[str(item_id)] if str(item_id) in resumed else next(new_results)
+                        for item_id, _, _, _ in items]
+
+    dedupe_reused = 0
+    dedupe_saved = 0
+    covers_resized = 0
+    covers_resize_cached = 0
+    for item_id, success, details in item_results:
         results.append((item_id, success, details))
-        
+
         if details.get("metadata_copied"):
             metadata_count += 1
         if details.get("cover_copied"):
             cover_count += 1
-            
-    return results, {"metadata_total": metadata_count, "cover_total": cover_count}
\ No newline at end of file
+        if details.get("metadata_unchanged"):
+            metadata_unchanged += 1
+        if details.get("cover_unchanged"):
+            cover_unchanged += 1
+        bytes_copied += details.get("metadata_bytes", 0) + details.get("cover_bytes", 0)
+        if "cover_dedupe_saved" in details:
+            dedupe_reused += 1
+            dedupe_saved += details["cover_dedupe_saved"]
+        if details.get("cover_resize") == "resized":
+            covers_resized += 1
+        elif details.get("cover_resize") == "cached":
+            covers_resize_cached += 1
+
+    elapsed = time.perf_counter() - started
+    metrics.exports_total.inc()
+    latency_p95 = metrics.percentile(item_latencies, 0.95)
+    counts = {"metadata_total": metadata_count, "cover_total": cover_count,
+              "metadata_unchanged_total": metadata_unchanged, "cover_unchanged_total": cover_unchanged,
+              "bytes_copied": bytes_copied,
+              "elapsed_seconds": round(elapsed, 3),
+              "files_per_second": round(files_this_run / elapsed, 1) if elapsed > 0 else 0.0,
+              "item_latency_p95_ms": round(latency_p95 * 1000, 2) if latency_p95 is not None else None,
+              "resumed_total": len(items) - len(pending)}
+    if context.cover_store is not None:
+        counts["cover_dedupe_reused"] = dedupe_reused
+        counts["cover_dedupe_bytes_saved"] = dedupe_saved
+    if context.thumbnailer is not None:
+        counts["cover_resized"] = covers_resized
+        counts["cover_resize_cached"] = covers_resize_cached
+    return results, counts
+
+# Read size for streaming files into an archive
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+
+def _archive_member_name(path, filename):
+    """Builds a safe relative member name '<path>/<filename>' (no absolute paths or '..')."""
+    parts = [part for part in posixpath.normpath(str(path or "").replace(os.sep, "/")).split("/")
+             if part not in ("", ".", "..")]
+    return "/".join(parts + [filename])
+
+def iter_export_archive(items, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Streams metadata.json and cover.jpg of the given (id, path, title, author)
+    items as an uncompressed tar archive laid out by path, yielding bytes chunks.
+    Nothing is staged on disk and memory use is bounded by chunk_size,
+    independent of the number or size of files."""
+    for item_id, path, title, author in items:
+        for filename in MEDIA_FILES:
+            source_path = os.path.join(get_source_item_path(item_id), filename)
+            try:
+                f = open(source_path, 'rb')
+            except OSError:
+                continue
+            with f:
+                st = os.fstat(f.fileno())
+                info = tarfile.TarInfo(_archive_member_name(path, filename))
+                info.size = st.st_size
+                info.mtime = int(st.st_mtime)
+                info.mode = 0o644
+                yield info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8')
+                remaining = info.size
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        # File shrank while streaming; keep the header's size
+                        chunk = b"\0" * min(chunk_size, remaining)
+                    remaining -= len(chunk)
+                    yield chunk
+                padding = -info.size % tarfile.BLOCKSIZE
+                if padding:
+                    yield b"\0" * padding
+    # End-of-archive marker: two zero blocks
+    yield b"\0" * (tarfile.BLOCKSIZE * 2)
+
+
+def main(argv=None):
+    """Command-line entry point: python -m abs_export export --library NAME --dest PATH"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m abs_export",
+                                     description="Eksport metadanych i okładek Audiobookshelf bez interfejsu WWW.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("libraries", help="wypisz nazwy bibliotek")
+
+    export_parser = commands.add_parser("export", help="eksportuj całą bibliotekę (lub wybrane pozycje)")
+    export_parser.add_argument("--library", required=True, help="nazwa biblioteki")
+    export_parser.add_argument("--dest", required=True, help="katalog docelowy eksportu")
+    export_parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="liczba równoległych wątków kopiowania")
+    export_parser.add_argument("--item", action="append", dest="item_ids", metavar="ID",
+                               help="eksportuj tylko pozycję o tym ID (można powtarzać)")
+    export_parser.add_argument("--compare", action="store_true", help="dołącz wynik porównania z nazwą folderu")
+    export_parser.add_argument("--incremental", action="store_true", default=None, help="pomiń pliki niezmienione od poprzedniego eksportu")
+    export_parser.add_argument("--dedupe-covers", action="store_true", default=None, help="zapisuj identyczne okładki raz i linkuj")
+    export_parser.add_argument("--copy-strategy", default=None, help="metoda kopiowania (auto, hardlink, copy_file_range, ...)")
+    export_parser.add_argument("--cover-size", type=int, default=None,
+                               help="zmniejsz okładki do tylu pikseli (wymaga Pillow, 0 = oryginał)")
+    export_parser.add_argument("--enrich-metadata", action="store_true", default=None,
+                               help="zapisz metadata.json uzupełniony o tytuł, autorów, rok i serię z katalogu")
+    export_parser.add_argument("--pipeline", action="store_true", default=None,
+                               help="eksport etapowy: osobne wątki skanowania, tworzenia folderów i kopiowania")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "libraries":
+        for name in list_library_names():
+            print(name)
+        return 0
+
+    lib_id = get_library_id_by_name(args.library)
+    if not lib_id:
+        print(f"Nie znaleziono biblioteki '{args.library}'.", file=sys.stderr)
+        return 2
+    items = get_items_by_library(lib_id)
+    if args.item_ids:
+        wanted = set(args.item_ids)
+        items = [item for item in items if str(item[0]) in wanted]
+    if not items:
+        print("Brak pozycji do wyeksportowania.", file=sys.stderr)
+        return 2
+
+    comparisons = {}
+    if args.compare:
+        results = folder_match.compare_batch([(title, author, path) for _, path, title, author in items])
+        comparisons = {str(item[0]): result for item, result in zip(items, results)}
+
+    output_lock = threading.Lock()
+    files_copied = 0
+    errors = 0
+
+    def on_result(item_id, success, details):
+        nonlocal files_copied, errors
+        record = {"id": item_id, "success": success}
+        record.update(details)
+        if args.compare:
+            record["comparison"] = comparisons.get(str(item_id))
+        line = json.dumps(record, ensure_ascii=False)
+        with output_lock:
+            files_copied += int(bool(details.get("metadata_copied"))) + int(bool(details.get("cover_copied")))
+            if details.get("overall_class") == "error":
+                errors += 1
+            print(line, flush=True)
+
+    results, counts = export_items(items, args.dest, workers=args.workers, incremental=args.incremental,
+                                   on_result=on_result, copy_strategy=args.copy_strategy,
+                                   dedupe_covers=args.dedupe_covers, pipeline=args.pipeline,
+                                   cover_size=args.cover_size, enrich_metadata=args.enrich_metadata)
+    elapsed = counts.get("elapsed_seconds", 0)
+
+    # Messages about the export root itself (item ID None) are not reported per item
+    for item_id, success, details in results:
+        if item_id is None and details.get("overall_class") == "error":
+            print(details["overall_message"], file=sys.stderr)
+            errors += 1
+
+    summary = dict(counts, items=len(items), files_copied=files_copied, errors=errors,
+                   items_per_second=round(len(items) / elapsed, 1) if elapsed > 0 else None)
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
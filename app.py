@@ -1,121 +1,166 @@
-from flask import Flask, render_template_string, request, flash, redirect, url_for
+from flask import Flask, render_template_string, request, flash, redirect, url_for, jsonify, abort, Response, stream_with_context
+from werkzeug.http import is_resource_modified
 import abs_export
+import export_jobs
+import folder_match
+import search_index
+import metrics
+import cover_thumbnails
 import os
-import re
-# NOWY IMPORT: Dodajemy difflib do porównywania podobieństwa tekstów
-import difflib
+import json
+import tempfile
+import hashlib
+from datetime import datetime, timezone
+from urllib.parse import quote
+import threading
+from collections import OrderedDict
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_key_dla_flash_messages' # Required for flash messages
 
-def parse_folder_name(folder_name):
-    """
-    Parsuje nazwę folderu w formacie: 'Autor - Tytuł' z dopiskami typu 'czyta', 'tom', '[audiobook]'
-    """
-    import re
-
-    # Usuń część po 'czyta ...'
-    cleaned = re.sub(r'czyta .*?(?=\[|$)', '', folder_name, flags=re.IGNORECASE)
-
-    # Usuń nawiasy kwadratowe i ich zawartość, np. [audiobook PL]
-    cleaned = re.sub(r'\[.*?\]', '', cleaned)
-
-    # Usuń dopiski typu 'cykl ...' i 'tom X'
-    cleaned = re.sub(r'(?i)cykl .*?(?= -|$)', '', cleaned)
-    cleaned = re.sub(r'(?i)tom \d+', '', cleaned)
-
-    cleaned = cleaned.strip()
-
-    # Dopasuj: Autor - Tytuł (opcjonalnie z rokiem)
-    pattern = r'^(.+?)\s*-\s*(.+?)(?:\s*\((\d{4})\))?$'
-    match = re.match(pattern, cleaned)
-
-    if match:
-        authors_str, title, year = match.groups()
-        authors = [a.strip() for a in authors_str.split(',')]
-        return authors, title.strip(), year
-
-    return None, None, None
-
-def normalize_text(text):
-    """Normalizuje tekst do porównania - usuwa diakrytyki, zmienia na małe litery"""
-    if not text:
-        return ""
-    
-    # Podstawowe mapowanie polskich znaków
-    replacements = {
-        'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n', 'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
-        'Ą': 'a', 'Ć': 'c', 'Ę': 'e', 'Ł': 'l', 'Ń': 'n', 'Ó': 'o', 'Ś': 's', 'Ź': 'z', 'Ż': 'z'
-    }
-    
-    normalized = text.lower()
-    for old, new in replacements.items():
-        normalized = normalized.replace(old, new)
-    
-    return normalized
-
-# ZMODYFIKOWANA FUNKCJA PORÓWNANIA
-def compare_metadata_with_folder(title, author, folder_path):
-    """
-    Porównuje metadane z nazwą folderu z większą elastycznością.
-    Zwraca dict z wynikami porównania.
-    """
-    import difflib
-    if not folder_path:
-        return {
-            'folder_parsed': False, 'match_status': 'no_path', 'folder_name': '',
-            'parsed_title': '', 'parsed_authors': []
-        }
-
-    folder_name = os.path.basename(folder_path)
-    parsed_authors, parsed_title, parsed_year = parse_folder_name(folder_name)
-
-    if not parsed_title or not parsed_authors:
-        return {
-            'folder_parsed': False, 'match_status': 'parse_failed', 'folder_name': folder_name,
-            'parsed_title': '', 'parsed_authors': []
-        }
-
-    # Porównanie tytułów
-    normalized_title = normalize_text(title)
-    normalized_parsed_title = normalize_text(parsed_title)
-    title_similarity = difflib.SequenceMatcher(None, normalized_title, normalized_parsed_title).ratio()
-    title_match = (normalized_parsed_title in normalized_title or 
-                   normalized_title in normalized_parsed_title or 
-                   title_similarity > 0.7)
-
-    # Porównanie autorów z wykorzystaniem podobieństwa tekstu
-    metadata_authors = [normalize_text(a) for a in author.split(',')]
-    normalized_parsed_authors = [normalize_text(a) for a in parsed_authors]
-
-    authors_match = False
-    for meta_author in metadata_authors:
-        for folder_author in normalized_parsed_authors:
-            similarity = difflib.SequenceMatcher(None, meta_author, folder_author).ratio()
-            if similarity > 0.75:
-                authors_match = True
-                break
-        if authors_match:
-            break
-
-    # Określenie wyniku
-    if title_match and authors_match:
-        match_status = 'full_match'
-    elif title_match:
-        match_status = 'title_only'
-    elif authors_match:
-        match_status = 'authors_only'
-    else:
-        match_status = 'no_match'
-
-    return {
-        'folder_parsed': True,
-        'match_status': match_status,
-        'folder_name': folder_name,
-        'parsed_title': parsed_title,
-        'parsed_authors': parsed_authors
-    }
-
+class ComparisonCache:
+    """Bounded LRU cache of compare_metadata_with_folder results keyed by
+    (title, author, path), optionally persisted to a JSON file across restarts."""
+
+    # Bump when the comparison logic changes so persisted results are discarded
+    FORMAT_VERSION = 1
+
+    def __init__(self, maxsize=100000, filepath=None):
+        self.maxsize = maxsize
+        self.filepath = filepath
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def get_many(self, triples):
+        """Returns the comparison results for a list of (title, author, path)
+        tuples; all misses are classified together through folder_match.compare_batch."""
+        results = [None] * len(triples)
+        missing = {}
+        with self._lock:
+            for index, key in enumerate(triples):
+                key = tuple(key)
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results[index] = result
+                else:
+                    self.misses += 1
+                    missing.setdefault(key, []).append(index)
+        if not missing:
+            return results
+        keys = list(missing)
+        computed = folder_match.compare_batch(keys)
+        with self._lock:
+            for key, result in zip(keys, computed):
+                for index in missing[key]:
+                    results[index] = result
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+    def load(self):
+        if not self.filepath or not os.path.exists(self.filepath):
+            return self
+        try:
+            with open(self.filepath, mode='r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != self.FORMAT_VERSION:
+                return self
+            with self._lock:
+                for title, author, path, result in data.get("entries", [])[-self.maxsize:]:
+                    self._entries[(title, author, path)] = result
+        except Exception as e:
+            print(f"Błąd odczytu cache porównań '{self.filepath}': {e}")
+        return self
+
+    def save(self):
+        """Writes the cache to filepath (if configured and changed) via a unique
+        temp file + rename, so concurrent saves never write into the same file."""
+        if not self.filepath:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[title, author, path, result] for (title, author, path), result in self._entries.items()]
+            self._dirty = False
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filepath)),
+                                            prefix=".compare_cache-", suffix=".tmp")
+            with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+                json.dump({"version": self.FORMAT_VERSION, "entries": entries}, f)
+            os.replace(tmp_path, self.filepath)
+            tmp_path = None
+        except Exception as e:
+            print(f"Błąd zapisu cache porównań '{self.filepath}': {e}")
+            with self._lock:
+                self._dirty = True
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+comparison_cache = ComparisonCache(
+    maxsize=int(os.environ.get("ABS_COMPARE_CACHE_SIZE", "100000")),
+    filepath=os.environ.get("ABS_COMPARE_CACHE_PATH") or None,
+).load()
+
+class ItemViewCache:
+    """Bounded LRU cache of per-library item views (items with their folder
+    comparisons) keyed by (library id, compare flag). Entries are valid for one
+    catalog version; a catalog reload drops them all."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, lib_id, compare_folders, build):
+        """Returns the cached view, or build(lib_id, compare_folders) stored for the current version."""
+        abs_export.catalog.refresh()
+        version = abs_export.catalog.version
+        key = (str(lib_id), bool(compare_folders))
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            view = self._entries.get(key)
+            if view is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return view
+            self.misses += 1
+        view = tuple(build(lib_id, compare_folders))
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = view
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return view
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "catalog_version": self.version,
+                    "hits": self.hits, "misses": self.misses}
+
+item_view_cache = ItemViewCache(maxsize=int(os.environ.get("ABS_ITEM_VIEW_CACHE_SIZE", "16")))
 
 # ZMODYFIKOWANY TEMPLATE - POPRAWIONE KOLORY W TABELI WYNIKÓW
 TEMPLATE = """
@@ -176,6 +221,7 @@ TEMPLATE = """
         .status-exists { background-color: #d1ecf1; color: #0c5460; }
         .status-skipped { background-color: #e2e3e5; color: #383d41; }
         .status-info { background-color: #cce5ff; color: #004085; }
+        .status-unchanged { background-color: #e8f4ea; color: #4a6b52; }
 
         .summary-box {
             background-color: #e9f7ef;
@@ -195,6 +241,9 @@ TEMPLATE = """
             padding-left: 10px;
             margin-bottom: 10px;
         }
+        .media-badge { font-size: 0.8em; padding: 1px 6px; border-radius: 3px; margin-left: 5px; }
+        .media-badge.present { background-color: #d4edda; color: #155724; }
+        .media-badge.absent { background-color: #fff3cd; color: #856404; }
         .match-info {
             font-size: 0.9em;
             color: #666;
@@ -257,18 +306,40 @@ TEMPLATE = """
   <input type="hidden" name="library" value="{{ selected_lib }}">
 </form>
 
-{% if selected_lib and not items %}
+{% if selected_lib and not item_count %}
     <p>Brak pozycji do wyeksportowania w wybranej bibliotece lub wystąpił błąd podczas ich pobierania.</p>
-{% elif items %}
-<form method="post" action="/export">
+{% elif item_count %}
+<form method="post" action="/export" id="export-form" onsubmit="prepareExportForm()">
   <div class="form-group">
     <label for="export_path">Katalog docelowy eksportu:</label>
     <input type="text" id="export_path" name="export_path" value="{{ default_export_path }}" placeholder="np. /exported_audiobooks">
     <small>Pliki zostaną skopiowane do <code>[Katalog docelowy]/[path_z_CSV]</code>.</small><br>
     <small>Okładki i metadane będą szukane w <code>{{abs_media_root}}/[ID_z_CSV]/</code>.</small>
   </div>
+
+  <div class="form-group">
+    <input type="checkbox" name="incremental" id="incremental" value="1" {% if incremental %}checked{% endif %}>
+    <label for="incremental" style="display: inline-block;">Eksport przyrostowy (pomiń pliki niezmienione od poprzedniego eksportu)</label>
+  </div>
+
+  <div class="form-group">
+    <input type="checkbox" name="dedupe_covers" id="dedupe_covers" value="1" {% if dedupe_covers %}checked{% endif %}>
+    <label for="dedupe_covers" style="display: inline-block;">Deduplikuj okładki (identyczne pliki zapisywane raz i linkowane)</label>
+  </div>
+
+  <div class="form-group">
+    <input type="checkbox" name="enrich_metadata" id="enrich_metadata" value="1" {% if enrich_metadata %}checked{% endif %}>
+    <label for="enrich_metadata" style="display: inline-block;">Uzupełnij metadata.json (tytuł i autorzy z katalogu, rok i seria z nazwy folderu)</label>
+  </div>
+
+  {% if cover_resize_available %}
+  <div class="form-group">
+    <label for="cover_size">Maksymalny rozmiar okładki (px, puste = oryginał):</label>
+    <input type="number" name="cover_size" id="cover_size" min="16" step="1" value="{{ cover_size or '' }}" placeholder="np. 600">
+  </div>
+  {% endif %}
   
-  <h2>Wybierz pozycje do eksportu ({{ items|length }} znaleziono):</h2>
+  <h2>Wybierz pozycje do eksportu ({{ item_count }} znaleziono):</h2>
   
   <div class="form-group">
     <label for="search-input">Szukaj pozycji:</label>
@@ -277,55 +348,47 @@ TEMPLATE = """
   
   {% if compare_folders %}
   <div class="filter-options">
-    <label><input type="checkbox" id="filter-full" checked onchange="filterByMatch()"> Pełne dopasowanie</label>
-    <label><input type="checkbox" id="filter-title" checked onchange="filterByMatch()"> Tylko tytuł</label>
-    <label><input type="checkbox" id="filter-authors" checked onchange="filterByMatch()"> Tylko autorzy</label>
-    <label><input type="checkbox" id="filter-none" checked onchange="filterByMatch()"> Brak dopasowania</label>
-    <label><input type="checkbox" id="filter-error" checked onchange="filterByMatch()"> Błąd parsowania</label>
+    <label><input type="checkbox" id="filter-full" data-filter="full" checked onchange="filterByMatch()"> Pełne dopasowanie</label>
+    <label><input type="checkbox" id="filter-title" data-filter="title" checked onchange="filterByMatch()"> Tylko tytuł</label>
+    <label><input type="checkbox" id="filter-authors" data-filter="authors" checked onchange="filterByMatch()"> Tylko autorzy</label>
+    <label><input type="checkbox" id="filter-none" data-filter="none" checked onchange="filterByMatch()"> Brak dopasowania</label>
+    <label><input type="checkbox" id="filter-error" data-filter="error" checked onchange="filterByMatch()"> Błąd parsowania</label>
   </div>
   {% endif %}
 
   <div class="form-group">
-    <button type="button" onclick="selectAllItems()">Zaznacz wszystkie widoczne</button>
-    <button type="button" onclick="deselectAllItems()">Odznacz wszystkie widoczne</button>
+    <button type="button" onclick="selectAllItems()">Zaznacz wszystkie pasujące</button>
+    <button type="button" onclick="deselectAllItems()">Odznacz wszystkie</button>
+    <small id="selection-info"></small>
   </div>
 
-  <div class="item-list" id="item-list">
-  {% for item_id, path, title, author, comparison in items %}
-    <div class="item-entry match-{{ comparison.match_status if comparison else 'none' }}" 
-         data-title="{{ title|lower }}" 
-         data-author="{{ author|lower }}"
-         data-match="{{ comparison.match_status if comparison else 'none' }}">
-      <input type="checkbox" name="items" value="{{ item_id }}" id="item-{{ item_id }}">
-      <label for="item-{{ item_id }}">
-        <strong>{{ title }}</strong> – {{ author }} (ID: {{ item_id }})
-        <br><small>Ścieżka: {{ path }}</small>
-        {% if comparison and comparison.folder_parsed %}
-          <div class="match-info">
-            <strong>Folder:</strong> {{ comparison.folder_name }}<br>
-            <strong>Sparsowane:</strong> {{ comparison.parsed_authors|join(', ') }} – {{ comparison.parsed_title }}<br>
-            <strong>Dopasowanie:</strong> 
-            {% if comparison.match_status == 'full_match' %}✓ Pełne dopasowanie
-            {% elif comparison.match_status == 'title_only' %}⚠ Tylko tytuł
-            {% elif comparison.match_status == 'authors_only' %}⚠ Tylko autorzy
-            {% else %}✗ Brak dopasowania
-            {% endif %}
-          </div>
-        {% elif comparison and not comparison.folder_parsed %}
-          <div class="match-info">
-            <strong>Folder:</strong> {{ comparison.folder_name }}<br>
-            <strong>Status:</strong> Nie można sparsować nazwy folderu
-          </div>
-        {% endif %}
-      </label>
-    </div>
-  {% endfor %}
-  </div>
+  <div class="item-list" id="item-list"
+       data-api-url="{{ url_for('api_items') }}"
+       data-library="{{ selected_lib }}"
+       data-compare="{{ '1' if compare_folders else '' }}"></div>
+  <small id="item-list-status"></small>
   <input type="hidden" name="library" value="{{ selected_lib }}">
-  <button type="submit" style="margin-top: 15px;">Eksportuj zaznaczone</button>
+  <input type="hidden" name="compare_folders" value="{{ '1' if compare_folders else '' }}">
+  <input type="hidden" name="select_all_matching" id="select-all-matching" value="">
+  <input type="hidden" name="q" id="select-all-q" value="">
+  <input type="hidden" name="match" id="select-all-match" value="" disabled>
+  <div id="selection-inputs"></div>
+  <button type="submit" name="target" value="directory" style="margin-top: 15px;">Eksportuj zaznaczone</button>
+  <button type="submit" name="target" value="archive" style="margin-top: 15px;">Pobierz zaznaczone jako archiwum .tar</button>
 </form>
 {% endif %}
 
+{% if job and not job.finished %}
+  <h2>Eksport w toku</h2>
+  <div class="summary-box" id="job-progress" data-progress-url="{{ url_for('export_job_progress', job_id=job.id) }}">
+    <p>Zadanie: {{ job.id }} ({{ job.export_path }})</p>
+    <p>Przetworzone pozycje: <span id="job-done">{{ job.done }}</span> / {{ job.items_total }}</p>
+    <p>Skopiowane pliki: <span id="job-files">{{ job.files_copied }}</span></p>
+    <p>Błędy: <span id="job-errors">{{ job.errors }}</span></p>
+    <p>Przepustowość: <span id="job-rate">0</span> poz./s</p>
+  </div>
+{% endif %}
+
 {% if results %}
   <h2>Wyniki eksportu:</h2>
   <table>
@@ -360,83 +423,252 @@ TEMPLATE = """
       <p>Podsumowanie eksportu:</p>
       <p>Liczba skopiowanych plików metadata.json: {{ counts.metadata_total }}</p>
       <p>Liczba skopiowanych plików cover.jpg: {{ counts.cover_total }}</p>
+      {% if counts.cover_dedupe_reused %}
+      <p>Okładki powiązane z identyczną kopią: {{ counts.cover_dedupe_reused }} (zaoszczędzono {{ '%.1f'|format(counts.cover_dedupe_bytes_saved / 1048576) }} MB)</p>
+      {% endif %}
+      {% if counts.metadata_unchanged_total or counts.cover_unchanged_total %}
+      <p>Pominięte bez zmian: metadata.json {{ counts.metadata_unchanged_total }}, cover.jpg {{ counts.cover_unchanged_total }}</p>
+      {% endif %}
+      {% if counts.resumed_total %}
+      <p>Wznowiono przerwany eksport: {{ counts.resumed_total }} pozycji ukończonych wcześniej pominięto (są wliczone w podsumowanie)</p>
+      {% endif %}
+      {% if counts.cover_resized is defined %}
+      <p>Okładki zmniejszone: {{ counts.cover_resized + counts.cover_resize_cached }} (w tym z pamięci podręcznej: {{ counts.cover_resize_cached }})</p>
+      {% endif %}
+      {% if counts.elapsed_seconds is defined %}
+      <p>Skopiowano {{ '%.1f'|format(counts.bytes_copied / 1048576) }} MB w {{ counts.elapsed_seconds }} s ({{ counts.files_per_second }} plików/s{% if counts.item_latency_p95_ms is not none %}, p95 czasu pozycji: {{ counts.item_latency_p95_ms }} ms{% endif %})</p>
+      {% endif %}
     </div>
   {% endif %}
 {% endif %}
 
 <script>
-function selectAllItems() {
-    var items = document.querySelectorAll('#item-list input[type="checkbox"]');
-    items.forEach(function(checkbox) {
-        if (checkbox.closest('.item-entry').style.display !== 'none') {
-            checkbox.checked = true;
+// Lista pozycji jest ładowana stronami z /api/items podczas przewijania.
+// Zaznaczenie to albo zbiór ID, albo "wszystkie pasujące do filtra" minus wykluczone.
+var itemState = {
+    offset: 0, total: null, loading: false, generation: 0,
+    selected: {}, selectAll: false, excluded: {}, searchTimer: null
+};
+
+function matchFilterValue() {
+    var boxes = document.querySelectorAll('.filter-options input[data-filter]');
+    if (!boxes.length) return null; // Jeśli nie ma filtrów dopasowania, pokaż wszystko
+    var keys = [];
+    boxes.forEach(function(box) { if (box.checked) keys.push(box.getAttribute('data-filter')); });
+    return keys.join(',');
+}
+
+function itemsUrl(list, offset) {
+    var params = new URLSearchParams();
+    params.set('library', list.getAttribute('data-library'));
+    if (list.getAttribute('data-compare')) params.set('compare_folders', '1');
+    params.set('q', document.getElementById('search-input').value);
+    var match = matchFilterValue();
+    if (match !== null) params.set('match', match);
+    params.set('offset', offset);
+    return list.getAttribute('data-api-url') + '?' + params.toString();
+}
+
+function isItemSelected(itemId) {
+    return itemState.selectAll ? !itemState.excluded[itemId] : !!itemState.selected[itemId];
+}
+
+function onItemToggle(checkbox) {
+    var itemId = checkbox.value;
+    if (itemState.selectAll) {
+        if (checkbox.checked) delete itemState.excluded[itemId]; else itemState.excluded[itemId] = true;
+    } else {
+        if (checkbox.checked) itemState.selected[itemId] = true; else delete itemState.selected[itemId];
+    }
+    updateSelectionInfo();
+}
+
+function appendText(parent, tag, text) {
+    var element = document.createElement(tag);
+    element.textContent = text;
+    parent.appendChild(element);
+    return element;
+}
+
+function renderItem(item) {
+    var comparison = item.comparison;
+    var match = comparison ? comparison.match_status : 'none';
+    var entry = document.createElement('div');
+    entry.className = 'item-entry match-' + match;
+
+    var checkbox = document.createElement('input');
+    checkbox.type = 'checkbox';
+    checkbox.value = item.id;
+    checkbox.id = 'item-' + item.id;
+    checkbox.checked = isItemSelected(item.id);
+    checkbox.onchange = function() { onItemToggle(checkbox); };
+    entry.appendChild(checkbox);
+
+    var label = document.createElement('label');
+    label.htmlFor = checkbox.id;
+    appendText(label, 'strong', item.title || '');
+    label.appendChild(document.createTextNode(' – ' + (item.author || '') + ' (ID: ' + item.id + ')'));
+    [['metadata.json', item.has_metadata], ['cover.jpg', item.has_cover]].forEach(function(file) {
+        var badge = appendText(label, 'span', (file[1] ? '✓ ' : '✗ ') + file[0]);
+        badge.className = 'media-badge ' + (file[1] ? 'present' : 'absent');
+    });
+    label.appendChild(document.createElement('br'));
+    appendText(label, 'small', 'Ścieżka: ' + (item.path || ''));
+
+    if (comparison) {
+        var info = document.createElement('div');
+        info.className = 'match-info';
+        appendText(info, 'strong', 'Folder:');
+        info.appendChild(document.createTextNode(' ' + comparison.folder_name));
+        info.appendChild(document.createElement('br'));
+        if (comparison.folder_parsed) {
+            var labels = {
+                'full_match': '✓ Pełne dopasowanie', 'title_only': '⚠ Tylko tytuł',
+                'authors_only': '⚠ Tylko autorzy'
+            };
+            appendText(info, 'strong', 'Sparsowane:');
+            info.appendChild(document.createTextNode(' ' + comparison.parsed_authors.join(', ') + ' – ' + comparison.parsed_title));
+            info.appendChild(document.createElement('br'));
+            appendText(info, 'strong', 'Dopasowanie:');
+            info.appendChild(document.createTextNode(' ' + (labels[match] || '✗ Brak dopasowania')));
+        } else {
+            appendText(info, 'strong', 'Status:');
+            info.appendChild(document.createTextNode(' Nie można sparsować nazwy folderu'));
         }
+        label.appendChild(info);
+    }
+    entry.appendChild(label);
+    return entry;
+}
+
+function loadMoreItems() {
+    var list = document.getElementById('item-list');
+    if (!list || itemState.loading) return;
+    if (itemState.total !== null && itemState.offset >= itemState.total) return;
+    itemState.loading = true;
+    var generation = itemState.generation;
+    fetch(itemsUrl(list, itemState.offset))
+        .then(function(response) { return response.json(); })
+        .then(function(page) {
+            if (generation !== itemState.generation) return;
+            page.items.forEach(function(item) { list.appendChild(renderItem(item)); });
+            itemState.offset += page.items.length;
+            itemState.total = page.total;
+            itemState.loading = false;
+            document.getElementById('item-list-status').textContent =
+                'Wyświetlono ' + itemState.offset + ' z ' + page.total + ' pasujących pozycji';
+            // Doładuj, dopóki lista nie jest przewijalna
+            if (page.items.length && list.scrollHeight <= list.clientHeight + 50) loadMoreItems();
+        })
+        .catch(function() { itemState.loading = false; });
+}
+
+function resetItems() {
+    var list = document.getElementById('item-list');
+    if (!list) return;
+    itemState.generation += 1;
+    itemState.offset = 0;
+    itemState.total = null;
+    itemState.loading = false;
+    list.innerHTML = '';
+    loadMoreItems();
+}
+
+function updateSelectionInfo() {
+    var info = document.getElementById('selection-info');
+    if (!info) return;
+    if (itemState.selectAll) {
+        var excluded = Object.keys(itemState.excluded).length;
+        info.textContent = 'Zaznaczono wszystkie pasujące' + (excluded ? ' (bez ' + excluded + ')' : '');
+    } else {
+        info.textContent = 'Zaznaczono: ' + Object.keys(itemState.selected).length;
+    }
+}
+
+function setLoadedCheckboxes(checked) {
+    document.querySelectorAll('#item-list input[type="checkbox"]').forEach(function(checkbox) {
+        checkbox.checked = checked;
     });
 }
 
+function selectAllItems() {
+    // Zaznaczenie jest zapamiętywane jako filtr, a nie lista tysięcy ID
+    itemState.selectAll = true;
+    itemState.excluded = {};
+    itemState.selected = {};
+    document.getElementById('select-all-matching').value = '1';
+    document.getElementById('select-all-q').value = document.getElementById('search-input').value;
+    var matchInput = document.getElementById('select-all-match');
+    var match = matchFilterValue();
+    matchInput.disabled = (match === null);
+    matchInput.value = match || '';
+    setLoadedCheckboxes(true);
+    updateSelectionInfo();
+}
+
 function deselectAllItems() {
-    var items = document.querySelectorAll('#item-list input[type="checkbox"]');
-    items.forEach(function(checkbox) {
-        if (checkbox.closest('.item-entry').style.display !== 'none') {
-            checkbox.checked = false;
-        }
-    });
+    itemState.selectAll = false;
+    itemState.excluded = {};
+    itemState.selected = {};
+    document.getElementById('select-all-matching').value = '';
+    setLoadedCheckboxes(false);
+    updateSelectionInfo();
 }
 
-function filterItems() {
-    var input = document.getElementById('search-input');
-    var filter = input.value.toLowerCase();
-    var itemEntries = document.querySelectorAll('.item-entry');
-
-    itemEntries.forEach(function(entry) {
-        var title = entry.getAttribute('data-title');
-        var author = entry.getAttribute('data-author');
-        var matchFilter = checkMatchFilter(entry);
-        
-        var textMatch = title.includes(filter) || author.includes(filter);
-        
-        if (textMatch && matchFilter) {
-            entry.style.display = '';
-        } else {
-            entry.style.display = 'none';
-        }
+function prepareExportForm() {
+    var container = document.getElementById('selection-inputs');
+    container.innerHTML = '';
+    var name = itemState.selectAll ? 'exclude' : 'items';
+    var ids = Object.keys(itemState.selectAll ? itemState.excluded : itemState.selected);
+    ids.forEach(function(itemId) {
+        var input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = name;
+        input.value = itemId;
+        container.appendChild(input);
     });
 }
 
-function checkMatchFilter(entry) {
-    var matchType = entry.getAttribute('data-match');
-    
-    var filterFull = document.getElementById('filter-full');
-    var filterTitle = document.getElementById('filter-title');
-    var filterAuthors = document.getElementById('filter-authors');
-    var filterNone = document.getElementById('filter-none');
-    var filterError = document.getElementById('filter-error');
-    
-    if (!filterFull) return true; // Jeśli nie ma filtrów dopasowania, pokaż wszystko
-    
-    switch(matchType) {
-        case 'full_match': return filterFull.checked;
-        case 'title_only': return filterTitle.checked;
-        case 'authors_only': return filterAuthors.checked;
-        case 'no_match': return filterNone.checked;
-        case 'parse_failed':
-        case 'no_path': return filterError.checked;
-        default: return true;
-    }
+function filterItems() {
+    // "Wszystkie pasujące" odnosi się do filtra z chwili zaznaczenia
+    if (itemState.selectAll) deselectAllItems();
+    clearTimeout(itemState.searchTimer);
+    itemState.searchTimer = setTimeout(resetItems, 250);
 }
 
 function filterByMatch() {
-    filterItems();
+    if (itemState.selectAll) deselectAllItems();
+    resetItems();
+}
+
+function pollJobProgress() {
+    var box = document.getElementById('job-progress');
+    if (!box) return;
+    fetch(box.getAttribute('data-progress-url'))
+        .then(function(response) { return response.json(); })
+        .then(function(progress) {
+            document.getElementById('job-done').textContent = progress.items_done;
+            document.getElementById('job-files').textContent = progress.files_copied;
+            document.getElementById('job-errors').textContent = progress.errors;
+            document.getElementById('job-rate').textContent = progress.items_per_second;
+            if (progress.state === 'done' || progress.state === 'failed') {
+                window.location.reload();
+            } else {
+                setTimeout(pollJobProgress, 1000);
+            }
+        })
+        .catch(function() { setTimeout(pollJobProgress, 5000); });
 }
 
 document.addEventListener('DOMContentLoaded', function() {
-    var searchInput = document.getElementById('search-input');
-    if (searchInput && searchInput.value) {
-        filterItems();
-    }
-    // Upewnij się, że filtrowanie po dopasowaniu jest uruchamiane przy starcie, jeśli filtry są widoczne
-    if(document.getElementById('filter-full')) {
-        filterByMatch();
+    pollJobProgress();
+    var list = document.getElementById('item-list');
+    if (list) {
+        list.addEventListener('scroll', function() {
+            if (list.scrollTop + list.clientHeight >= list.scrollHeight - 200) loadMoreItems();
+        });
+        resetItems();
+        updateSelectionInfo();
     }
 });
 </script>
@@ -444,6 +676,112 @@ document.addEventListener('DOMContentLoaded', function() {
 </html>
 """
 
+def build_item_view(lib_id, compare_folders):
+    """Returns (id, path, title, author, comparison) tuples for a library,
+    cached until the catalog is reloaded."""
+    return item_view_cache.get(lib_id, compare_folders, _compute_item_view)
+
+def _compute_item_view(lib_id, compare_folders):
+    raw_items = abs_export.get_items_by_library(lib_id)
+    if not compare_folders:
+        return [(item_id, path, title, author, None) for item_id, path, title, author in raw_items]
+
+    comparisons = comparison_cache.get_many([(title, author, path) for _, path, title, author in raw_items])
+    comparison_cache.save()
+    return [(item_id, path, title, author, comparison)
+            for (item_id, path, title, author), comparison in zip(raw_items, comparisons)]
+
+# Match-filter keys used by the UI checkboxes, per comparison match_status
+MATCH_FILTER_KEYS = {
+    'full_match': 'full', 'title_only': 'title', 'authors_only': 'authors',
+    'no_match': 'none', 'parse_failed': 'error', 'no_path': 'error',
+}
+
+# Page size limits for /api/items
+ITEMS_PAGE_SIZE = 100
+ITEMS_MAX_PAGE_SIZE = 1000
+
+def parse_match_filters(value):
+    """Parses the comma-separated match filter ('full,title,...'); None means no filtering."""
+    if value is None:
+        return None
+    return {key for key in value.split(',') if key}
+
+search = search_index.SearchIndex(abs_export.catalog)
+
+def filter_item_view(items, query="", match_filters=None):
+    """Filters (id, path, title, author, comparison) tuples by the title/author
+    search index and by the match-status filter keys."""
+    matching_ids = search.search(query) if query else None
+    filtered = []
+    for item in items:
+        item_id, _, _, _, comparison = item
+        if matching_ids is not None and str(item_id) not in matching_ids:
+            continue
+        if match_filters is not None and comparison is not None:
+            key = MATCH_FILTER_KEYS.get(comparison.get('match_status'))
+            if key is not None and key not in match_filters:
+                continue
+        filtered.append(item)
+    return filtered
+
+def _int_arg(name, default, minimum, maximum):
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, min(maximum, value))
+
+@app.route("/api/items", methods=["GET"])
+def api_items():
+    """Returns one page of a library's items, filtered on the server."""
+    selected_lib = request.args.get("library")
+    compare_folders = request.args.get("compare_folders") == "1"
+    lib_id = abs_export.get_library_id_by_name(selected_lib) if selected_lib else None
+    if not lib_id:
+        return jsonify({"error": f"Nie znaleziono biblioteki '{selected_lib}'."}), 404
+
+    offset = _int_arg("offset", 0, 0, 10 ** 9)
+    limit = _int_arg("limit", ITEMS_PAGE_SIZE, 1, ITEMS_MAX_PAGE_SIZE)
+    # File availability comes from the shared scan of ABS_MEDIA_ROOT, not per-item
+    # probes; an expired scan is refreshed in the background instead of here
+    media = abs_export.media_index.cached()
+
+    # A page only changes with the catalog files, the files present for the
+    # library's items and the query itself. The validators are derived from that
+    # content, so they match across rescans and server processes, and a client
+    # revalidating with ETag / Last-Modified gets a 304 before the view (and the
+    # folder comparison) is built, filtered or serialized
+    catalog = abs_export.catalog
+    media_digest, media_modified_at = abs_export.media_index.summary(
+        str(lib_id), [item[0] for item in build_item_view(lib_id, False)], media)
+    etag = hashlib.sha1(json.dumps([
+        catalog.signature, media_digest,
+        str(lib_id), compare_folders, request.args.get("q", ""), request.args.get("match"), offset, limit,
+    ]).encode("utf-8")).hexdigest()
+    last_modified = datetime.fromtimestamp(max(catalog.modified_at, media_modified_at),
+                                           tz=timezone.utc).replace(microsecond=0)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = jsonify(_item_page(lib_id, compare_folders, media, offset, limit))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+def _item_page(lib_id, compare_folders, media, offset, limit):
+    items = filter_item_view(build_item_view(lib_id, compare_folders),
+                             request.args.get("q", ""),
+                             parse_match_filters(request.args.get("match")))
+    page = []
+    for item_id, path, title, author, comparison in items[offset:offset + limit]:
+        files = media.get(str(item_id), {})
+        page.append({"id": item_id, "path": path, "title": title, "author": author,
+                     "comparison": comparison,
+                     "has_metadata": "metadata.json" in files, "has_cover": "cover.jpg" in files})
+    return {"total": len(items), "offset": offset, "limit": limit, "items": page}
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     libraries = abs_export.list_library_names()
@@ -453,7 +791,7 @@ def index():
     selected_lib = request.form.get("library") or request.args.get("library")
     compare_folders = request.form.get("compare_folders") == "1" or request.args.get("compare_folders") == "1"
     
-    items = []
+    item_count = 0
     results = None
     
     default_export_path = os.environ.get("ABS_EXPORT_DEFAULT_PATH", "/exported_audiobooks") 
@@ -461,27 +799,23 @@ def index():
     if selected_lib:
         lib_id = abs_export.get_library_id_by_name(selected_lib)
         if lib_id:
-            raw_items = abs_export.get_items_by_library(lib_id)
-            
-            items = []
-            for item in raw_items:
-                item_id, path, title, author = item
-                comparison = None
-                if compare_folders:
-                    comparison = compare_metadata_with_folder(title, author, path)
-                items.append((item_id, path, title, author, comparison))
+            # Items themselves are loaded page by page from /api/items
+            item_count = len(abs_export.get_items_by_library(lib_id))
         else:
             flash(f"Nie znaleziono ID dla biblioteki '{selected_lib}'. Sprawdź nazwę w pliku CSV.", "error")
 
     return render_template_string(TEMPLATE, 
                                   libraries=libraries, 
                                   selected_lib=selected_lib, 
-                                  items=items, 
+                                  item_count=item_count, 
                                   results=results,
                                   default_export_path=default_export_path,
                                   abs_media_root=abs_export.ABS_MEDIA_ROOT,
                                   counts=None,
-                                  compare_folders=compare_folders)
+                                  compare_folders=compare_folders,
+                                  cover_size=cover_thumbnails.COVER_MAX_SIZE,
+                                  enrich_metadata=abs_export.ENRICH_METADATA,
+                                  cover_resize_available=cover_thumbnails.available())
 
 @app.route("/export", methods=["POST"])
 def export():
@@ -489,12 +823,23 @@ def export():
     selected_lib = request.form.get("library")
     export_path = request.form.get("export_path")
     compare_folders = request.form.get("compare_folders") == "1"
-
-    if not export_path:
+    incremental = request.form.get("incremental") == "1"
+    dedupe_covers = request.form.get("dedupe_covers") == "1"
+    enrich_metadata = request.form.get("enrich_metadata") == "1"
+    try:
+        cover_size = max(0, int(request.form.get("cover_size") or 0))
+    except ValueError:
+        cover_size = 0
+    # "Zaznacz wszystkie pasujące" sends the filter instead of every item ID
+    select_all_matching = request.form.get("select_all_matching") == "1"
+    # "directory" copies into export_path on the server, "archive" streams a tar download
+    target = request.form.get("target", "directory")
+
+    if not export_path and target != "archive":
         flash("Musisz podać katalog docelowy eksportu.", "error")
         return redirect(url_for('index', library=selected_lib, compare_folders=compare_folders))
 
-    if not item_ids:
+    if not item_ids and not select_all_matching:
         flash("Nie wybrano żadnych pozycji do eksportu.", "error")
         return redirect(url_for('index', library=selected_lib, compare_folders=compare_folders))
 
@@ -507,47 +852,151 @@ def export():
         flash(f"Nie znaleziono ID dla biblioteki '{selected_lib}'. Eksport niemożliwy.", "error")
         return redirect(url_for('index'))
 
-    raw_items = abs_export.get_items_by_library(lib_id)
-    if not raw_items:
-        flash("Brak pozycji do wyeksportowania w wybranej bibliotece.", "error")
-        return redirect(url_for('index', library=selected_lib, compare_folders=compare_folders))
-
-    item_ids_str = [str(i) for i in item_ids]
-    items_dict = {str(item[0]): item for item in raw_items}
-    selected_items = [items_dict[item_id] for item_id in item_ids_str if item_id in items_dict]
+    selected_items = []
+    if select_all_matching:
+        match_filters = parse_match_filters(request.form.get("match"))
+        excluded = set(request.form.getlist("exclude"))
+        matching = filter_item_view(build_item_view(lib_id, compare_folders and match_filters is not None),
+                                    request.form.get("q", ""), match_filters)
+        selected_items = [(item_id, path, title, author)
+                          for item_id, path, title, author, _ in matching
+                          if str(item_id) not in excluded]
+    else:
+        for item_id in item_ids:
+            entry = abs_export.catalog.item(item_id)
+            if entry and entry[0] == str(lib_id):
+                selected_items.append(entry[1])
 
     if not selected_items:
         flash("Wybrane pozycje nie pasują do pozycji w danych. Eksport niemożliwy.", "error")
         return redirect(url_for('index', library=selected_lib, compare_folders=compare_folders))
 
-    results, counts = abs_export.export_items(selected_items, export_path)
-    
-    has_errors = any(not success for _, success, _ in results)
-    if has_errors:
-        flash("Eksport zakończony z błędami. Sprawdź wyniki poniżej.", "error")
-    else:
-        flash("Eksport zakończony pomyślnie!", "success")
-    
+    if target == "archive":
+        filename = quote(f"{selected_lib}.tar")
+        return Response(stream_with_context(abs_export.iter_export_archive(selected_items)),
+                        mimetype="application/x-tar",
+                        headers={"Content-Disposition": f"attachment; filename=\"export.tar\"; filename*=UTF-8''{filename}"})
+
+    job = export_jobs.ExportJob(selected_items, export_path, library=selected_lib,
+                                compare_folders=compare_folders, incremental=incremental,
+                                dedupe_covers=dedupe_covers, cover_size=cover_size,
+                                enrich_metadata=enrich_metadata)
+    export_jobs.manager.submit(job)
+    return redirect(url_for('export_job', job_id=job.id))
+
+@app.route("/export/<job_id>", methods=["GET"])
+def export_job(job_id):
+    job = export_jobs.manager.get(job_id)
+    if job is None:
+        flash("Nie znaleziono zadania eksportu (mogło zostać usunięte z historii).", "error")
+        return redirect(url_for('index'))
+
+    if job.finished:
+        if job.state == "failed":
+            flash(f"Eksport przerwany: {job.error_message}", "error")
+        elif job.has_errors:
+            flash("Eksport zakończony z błędami. Sprawdź wyniki poniżej.", "error")
+        else:
+            flash("Eksport zakończony pomyślnie!", "success")
+
     libraries = abs_export.list_library_names()
-    
-    items = []
-    for item in raw_items:
-        item_id, path, title, author = item
-        comparison = None
-        if compare_folders:
-            comparison = compare_metadata_with_folder(title, author, path)
-        items.append((item_id, path, title, author, comparison))
+    item_count = 0
+    lib_id = abs_export.get_library_id_by_name(job.library) if job.library else None
+    if lib_id:
+        item_count = len(abs_export.get_items_by_library(lib_id))
 
     return render_template_string(TEMPLATE, 
                                   libraries=libraries, 
-                                  selected_lib=selected_lib, 
-                                  items=items, 
-                                  results=results,
-                                  default_export_path=export_path,
+                                  selected_lib=job.library, 
+                                  item_count=item_count, 
+                                  results=job.results,
+                                  default_export_path=job.export_path,
                                   abs_media_root=abs_export.ABS_MEDIA_ROOT,
-                                  counts=counts,
-                                  compare_folders=compare_folders)
+                                  counts=job.counts,
+                                  compare_folders=job.compare_folders,
+                                  incremental=job.export_options.get("incremental"),
+                                  dedupe_covers=job.export_options.get("dedupe_covers"),
+                                  cover_size=job.export_options.get("cover_size"),
+                                  enrich_metadata=job.export_options.get("enrich_metadata"),
+                                  cover_resize_available=cover_thumbnails.available(),
+                                  job=job)
+
+@app.route("/compare-cache", methods=["GET"])
+def compare_cache_stats():
+    return jsonify(dict(comparison_cache.stats(), item_views=item_view_cache.stats()))
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 until warm_up() has loaded the catalog. While not
+    ready (e.g. the CSV files were missing at startup) each probe retries the
+    warm-up in the background."""
+    if not _ready.is_set():
+        start_warm_up()
+        return jsonify(ready=False), 503
+    return jsonify(ready=True, catalog_version=abs_export.catalog.version)
+
+@app.route("/export/<job_id>/progress", methods=["GET"])
+def export_job_progress(job_id):
+    job = export_jobs.manager.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.progress())
+
+# Also build the folder comparisons of every library during warm_up()
+WARM_COMPARISONS = os.environ.get("ABS_WARM_COMPARISONS", "1").lower() in ("1", "true", "yes")
+
+_ready = threading.Event()
+_warm_up_lock = threading.Lock()
+
+def warm_up(compare_folders=WARM_COMPARISONS):
+    """Loads the catalog, the search index, the media scan and the item lists
+    of every library (with folder comparisons, filling comparison_cache, if
+    compare_folders), then marks the app ready. Returns False without marking
+    it ready if the catalog has no libraries (files missing or unreadable).
+
+    Under gunicorn (gunicorn.conf.py) this runs in the master before forking, so
+    the workers share the loaded data copy-on-write instead of each parsing it."""
+    libraries = abs_export.list_library_names()
+    if not libraries:
+        print("Nie można załadować katalogu - aplikacja nie jest gotowa.")
+        return False
+    for name in libraries:
+        lib_id = abs_export.get_library_id_by_name(name)
+        if lib_id is None:
+            continue
+        build_item_view(lib_id, False)
+        if compare_folders:
+            build_item_view(lib_id, True)
+    search.ensure_current()
+    abs_export.media_index.snapshot()
+    # A live process pool must not be inherited by forked workers; it is
+    # spawned again on the next whole-library comparison
+    folder_match.shutdown_pool()
+    _ready.set()
+    return True
+
+def start_warm_up():
+    """Runs warm_up() in a background thread unless one is already running."""
+    if not _warm_up_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            if not _ready.is_set():
+                warm_up()
+        finally:
+            _warm_up_lock.release()
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
 
 if __name__ == "__main__":
+    # With debug=True the reloader runs this block in a watcher process and
+    # again in the serving child (WERKZEUG_RUN_MAIN=true); warm up only the latter
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warm_up()
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
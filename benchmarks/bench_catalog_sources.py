@@ -0,0 +1,96 @@
+"""CSV Catalog vs. SqliteCatalog on the same synthetic library.
+
+First checks that SqliteCatalog, reading an SQLite fixture generated from the
+CSV dumps (see synthetic_library.write_sqlite), returns exactly what the CSV
+Catalog returns - including books whose relPath, title or authors are NULL in
+the database - and that the folder comparison runs over every item. Then
+reports the cold load and per-library lookup times of both sources.
+
+Usage: python benchmarks/bench_catalog_sources.py [items] [repeats]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import abs_export
+import folder_match
+from synthetic_library import write_library, write_sqlite
+
+# Books with empty text columns, stored as NULL in the SQLite fixture
+BLANK_ITEMS = [
+    {"id": "blank-authors", "relPath": "Bez autora - Tytuł", "title": "Tytuł", "authorNamesFirstLast": ""},
+    {"id": "blank-title", "relPath": "Autor - ", "title": "", "authorNamesFirstLast": "Autor"},
+    {"id": "blank-path", "relPath": "", "title": "Tytuł", "authorNamesFirstLast": "Autor"},
+]
+
+
+def add_blank_items(csv_db, lib_id):
+    path = os.path.join(csv_db, "libraryItems.csv")
+    with open(path, encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f))
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, header, restval="")
+        for item in BLANK_ITEMS:
+            writer.writerow(dict(item, mediaType="book", isMissing="0", isFile="0", isInvalid="0",
+                                 libraryId=lib_id))
+
+
+def check(csv_catalog, sqlite_catalog):
+    names = csv_catalog.library_names()
+    assert sqlite_catalog.library_names() == names, "library names differ"
+    for name in names:
+        lib_id = csv_catalog.library_id(name)
+        assert sqlite_catalog.library_id(name) == lib_id, f"library id of {name!r} differs"
+        expected = csv_catalog.items(lib_id)
+        actual = sqlite_catalog.items(lib_id)
+        assert actual == expected, f"items of {name!r} differ"
+        for item in expected[:50] + expected[-len(BLANK_ITEMS):]:
+            assert sqlite_catalog.item(item[0]) == csv_catalog.item(item[0]), f"item {item[0]} differs"
+        triples = [(title, author, path) for _, path, title, author in actual]
+        assert folder_match.compare_batch(triples, processes=1) == \
+            folder_match.compare_batch([(t, a, p) for _, p, t, a in expected], processes=1)
+    assert sorted(sqlite_catalog.iter_items()) == sorted(csv_catalog.iter_items()), "iter_items differs"
+    print(f"check OK: {len(names)} libraries, NULL columns read as '' "
+          f"(e.g. {sqlite_catalog.item('blank-authors')[1]})")
+
+
+def measure(name, func, repeats):
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    print(f"{name:<28} min {min(runs) * 1000:9.2f} ms")
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        library = write_library(os.path.join(tmp, "library"), items, cover_kb=1)
+        csv_db = library["csv_db"]
+        add_blank_items(csv_db, "lib-0")
+        db_path = write_sqlite(csv_db, os.path.join(tmp, "absdatabase.sqlite"))
+
+        def csv_catalog():
+            return abs_export.Catalog(os.path.join(csv_db, "libraries.csv"),
+                                      os.path.join(csv_db, "libraryItems.csv"))
+
+        check(csv_catalog(), abs_export.SqliteCatalog(db_path))
+
+        lib_id = "lib-0"
+        measure("csv cold load + items", lambda: csv_catalog().items(lib_id), repeats)
+        measure("sqlite cold open + items", lambda: abs_export.SqliteCatalog(db_path).items(lib_id), repeats)
+        warm_csv, warm_sqlite = csv_catalog(), abs_export.SqliteCatalog(db_path)
+        measure("csv items (loaded)", lambda: warm_csv.items(lib_id), repeats)
+        measure("sqlite items (open)", lambda: warm_sqlite.items(lib_id), repeats)
+
+
+if __name__ == "__main__":
+    main()
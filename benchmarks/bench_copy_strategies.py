@@ -0,0 +1,55 @@
+"""Throughput (MB/s) of each abs_export.copy_file strategy on a local temp filesystem.
+
+Usage: python benchmarks/bench_copy_strategies.py [files] [size_mb] [directory]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import abs_export
+
+STRATEGIES = ["shutil.copy", "buffered", "sendfile", "copy_file_range", "reflink", "hardlink", "auto"]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    size_mb = float(sys.argv[2]) if len(sys.argv) > 2 else 4.0
+    directory = sys.argv[3] if len(sys.argv) > 3 else None
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        sources = []
+        for i in range(count):
+            path = os.path.join(tmp, f"cover-{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(os.urandom(int(size_mb * 1024 * 1024)))
+            sources.append(path)
+        total_mb = count * size_mb
+        print(f"{count} files x {size_mb} MB in {tmp}")
+
+        for strategy in STRATEGIES:
+            dest_dir = os.path.join(tmp, strategy)
+            os.makedirs(dest_dir)
+            used = set()
+            start = time.perf_counter()
+            try:
+                for path in sources:
+                    dest = os.path.join(dest_dir, os.path.basename(path))
+                    if strategy == "shutil.copy":
+                        shutil.copy(path, dest)
+                        used.add("shutil.copy")
+                    else:
+                        used.add(abs_export.copy_file(path, dest, strategy))
+            except OSError as e:
+                print(f"{strategy:<16} failed: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            print(f"{strategy:<16} {total_mb / elapsed:10.1f} MB/s   (used: {', '.join(sorted(used))})")
+            shutil.rmtree(dest_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Peak memory of reading one library from libraryItems.csv.
+
+Compares the previous read_csv_to_dicts + filter approach with the streaming
+abs_export.iter_library_items reader on a synthetic file.
+
+Usage: python benchmarks/bench_csv_memory.py [rows] [libraries]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import abs_export
+
+
+def write_synthetic_items(filepath, rows, libraries):
+    blob = '{"chapters": [' + ", ".join(['{"start": 0, "end": 1234.5}'] * 20) + ']}'
+    with open(filepath, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "libraryId", "mediaType", "isMissing", "relPath",
+                         "title", "authorNamesFirstLast", "libraryFiles"])
+        for i in range(rows):
+            writer.writerow([f"item-{i}", f"lib-{i % libraries}", "book", "0",
+                             f"Autor {i % 997} - Tytuł {i}", f"Tytuł {i}", f"Autor {i % 997}",
+                             blob])
+
+
+def previous_get_items_by_library(filepath, lib_id):
+    all_items = abs_export.read_csv_to_dicts(filepath)
+    items_for_lib = []
+    for item in all_items:
+        if (item.get('libraryId') == str(lib_id) and
+            item.get('mediaType') == 'book' and
+            item.get('isMissing') in ['0', 'false', 'False', False]):
+            items_for_lib.append((item.get('id'), item.get('relPath'),
+                                  item.get('title'), item.get('authorNamesFirstLast')))
+    return items_for_lib
+
+
+def streaming_get_items_by_library(filepath, lib_id):
+    return [entry for _, entry in abs_export.iter_library_items(filepath, lib_id)]
+
+
+def measure(label, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} items={len(result):>8}  peak={peak / 1024 / 1024:8.1f} MiB  time={elapsed:6.2f} s")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    libraries = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "libraryItems.csv")
+        write_synthetic_items(filepath, rows, libraries)
+        print(f"{rows} rows, {libraries} libraries, {os.path.getsize(filepath) / 1024 / 1024:.1f} MiB")
+        old = measure("previous", previous_get_items_by_library, filepath, "lib-0")
+        new = measure("streaming", streaming_get_items_by_library, filepath, "lib-0")
+        assert old == new, "streaming reader returned different items"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Scaling of abs_export.export_items with the number of worker threads.
+
+Per-file latency of a network mount is simulated by sleeping in
+os.scandir (media pre-scan), os.makedirs, os.mkdir and abs_export.copy_file
+before the real call. Each worker count is run with the thread pool and with
+the staged pipeline (workers then size its copy stage).
+
+Usage: python benchmarks/bench_export_parallel.py [items] [latency_ms]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import abs_export
+
+
+def with_latency(func, delay):
+    def wrapper(*args, **kwargs):
+        time.sleep(delay)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def create_media_root(root, count):
+    items = []
+    for i in range(count):
+        item_id = f"item-{i}"
+        folder = os.path.join(root, item_id)
+        os.makedirs(folder)
+        with open(os.path.join(folder, "metadata.json"), "w") as f:
+            f.write('{"title": "Tytuł %d"}' % i)
+        with open(os.path.join(folder, "cover.jpg"), "wb") as f:
+            f.write(os.urandom(32 * 1024))
+        items.append((item_id, f"Autor {i % 50}/Autor {i % 50} - Tytuł {i}", f"Tytuł {i}", f"Autor {i % 50}"))
+    return items
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        media_root = os.path.join(tmp, "media")
+        items = create_media_root(media_root, count)
+        abs_export.ABS_MEDIA_ROOT = media_root
+
+        os.scandir = with_latency(os.scandir, delay)
+        os.makedirs = with_latency(os.makedirs, delay)
+        os.mkdir = with_latency(os.mkdir, delay)
+        abs_export.copy_file = with_latency(abs_export.copy_file, delay)
+
+        print(f"{count} items, {delay * 1000:.1f} ms simulated latency per file operation")
+        baseline = None
+        for workers in (1, 2, 4, 8, 16, 32):
+            for pipeline in (False, True):
+                export_path = os.path.join(tmp, f"export-{workers}-{int(pipeline)}")
+                start = time.perf_counter()
+                results, counts = abs_export.export_items(items, export_path, workers=workers, pipeline=pipeline)
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                assert [r[0] for r in results[1:]] == [item[0] for item in items]
+                assert counts["metadata_total"] == count and counts["cover_total"] == count
+                mode = "pipeline" if pipeline else "pool"
+                print(f"workers={workers:>2} {mode:<8}  {elapsed:6.2f} s  {count / elapsed:8.1f} items/s  speedup x{baseline / elapsed:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
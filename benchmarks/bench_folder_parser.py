@@ -0,0 +1,154 @@
+"""Throughput of folder_match.parse_folder_name / normalize_text.
+
+First checks the implementation against the golden corpus in
+folder_names_golden.json (generated from the original regex parser), then
+reports names parsed per second for the previous and the current parser.
+
+Usage: python benchmarks/bench_folder_parser.py [repeats]
+       python benchmarks/bench_folder_parser.py --regenerate   # rewrite the golden file
+"""
+import json
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import folder_match
+
+GOLDEN_PATH = os.path.join(HERE, "folder_names_golden.json")
+
+CORPUS = [
+    # Formats listed in the README
+    "Andrzej Sapkowski - Ostatnie życzenie",
+    "Andrzej Sapkowski - Ostatnie życzenie (1993)",
+    "Andrzej Sapkowski - Ostatnie życzenie [audiobook]",
+    "Andrzej Sapkowski - Ostatnie życzenie [audiobook PL]",
+    "Andrzej Sapkowski - Ostatnie życzenie czyta Krzysztof Gosztyła",
+    "Andrzej Sapkowski - Ostatnie życzenie tom 1",
+    "Andrzej Sapkowski - Ostatnie życzenie cykl Wiedźmin",
+    # Combinations and edge cases
+    "Andrzej Sapkowski - cykl Wiedźmin - tom 1 - Ostatnie życzenie czyta Krzysztof Gosztyła [audiobook PL]",
+    "Andrzej Sapkowski - Krew elfów (1994) czyta Krzysztof Gosztyła",
+    "Terry Pratchett, Neil Gaiman - Dobry omen",
+    "Terry Pratchett,Neil Gaiman - Dobry omen (1990) [mp3]",
+    "Stanisław Lem - Solaris CZYTA Roch Siemianowski",
+    "Stanisław Lem - Solaris Czyta Roch Siemianowski [128kbps]",
+    "Stanisław Lem - Cyberiada TOM 2",
+    "Stanisław Lem-Bajki robotów",
+    "Stanisław Lem -Głos Pana",
+    "J.R.R. Tolkien - Władca Pierścieni - Drużyna Pierścienia",
+    "Olga Tokarczuk - Księgi Jakubowe (2014)",
+    "Olga Tokarczuk - Bieguni (2007) ",
+    "  Olga Tokarczuk - Prowadź swój pług przez kości umarłych  ",
+    "Ryszard Kapuściński - Heban [audiobook] czyta Jan Peszek",
+    "Joanna Chmielewska - Wszystko czerwone czyta Joanna Kulig [128kbps] [PL]",
+    "Marek Krajewski - Śmierć w Breslau cykl Eberhard Mock",
+    "Marek Krajewski - cykl Eberhard Mock - Śmierć w Breslau",
+    "Marek Krajewski - Festung Breslau tom 10",
+    "Marek Krajewski - Festung Breslau tom X",
+    "Atom[x] 5 - Tytuł",
+    "Autor - Atomtom 12",
+    "Autor - Przeczyta wszystko",
+    "Autor - Tytuł czyta",
+    "Autor - Tytuł (rok)",
+    "Autor - Tytuł (19999)",
+    "Autor - (2001)",
+    "Autor -  - Tytuł",
+    "Tylko tytuł bez autora",
+    "- Tytuł bez autora",
+    "Autor -",
+    "",
+    "[audiobook]",
+    "czyta Ktoś",
+    "ŁUKASZ ORBITOWSKI - INNA DUSZA",
+    "Łukasz Orbitowski - Kult (2019) cykl brak - dalej",
+    "Jacek Dukaj - Lód [cz. 1] [cz. 2]",
+    "Jacek Dukaj - Lód [nieskończony",
+    "Wisława Szymborska, Czesław Miłosz, Zbigniew Herbert - Wiersze wybrane",
+]
+
+TEXTS = [
+    "Zażółć gęślą jaźń", "ZAŻÓŁĆ GĘŚLĄ JAŹŃ", "Łódź", "Ćma Źdźbło Żółw", "Ąę Óó Ńń Śś",
+    "Straße", "İstanbul", "Ελληνικά", "", "Mieszane ĄĆĘŁŃÓŚŹŻ ąćęłńóśźż 123",
+]
+
+
+def previous_parse_folder_name(folder_name):
+    cleaned = re.sub(r'czyta .*?(?=\[|$)', '', folder_name, flags=re.IGNORECASE)
+    cleaned = re.sub(r'\[.*?\]', '', cleaned)
+    cleaned = re.sub(r'(?i)cykl .*?(?= -|$)', '', cleaned)
+    cleaned = re.sub(r'(?i)tom \d+', '', cleaned)
+    cleaned = cleaned.strip()
+    match = re.match(r'^(.+?)\s*-\s*(.+?)(?:\s*\((\d{4})\))?$', cleaned)
+    if match:
+        authors_str, title, year = match.groups()
+        return [a.strip() for a in authors_str.split(',')], title.strip(), year
+    return None, None, None
+
+
+def previous_normalize_text(text):
+    if not text:
+        return ""
+    replacements = {
+        'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n', 'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
+        'Ą': 'a', 'Ć': 'c', 'Ę': 'e', 'Ł': 'l', 'Ń': 'n', 'Ó': 'o', 'Ś': 's', 'Ź': 'z', 'Ż': 'z'
+    }
+    normalized = text.lower()
+    for old, new in replacements.items():
+        normalized = normalized.replace(old, new)
+    return normalized
+
+
+def golden_outputs(parse, normalize):
+    return {
+        "parse_folder_name": [[name, list(parse(name))] for name in CORPUS],
+        "normalize_text": [[text, normalize(text)] for text in TEXTS],
+    }
+
+
+def check_golden():
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    actual = json.loads(json.dumps(golden_outputs(folder_match.parse_folder_name, folder_match.normalize_text)))
+    mismatches = 0
+    for section in ("parse_folder_name", "normalize_text"):
+        for (name, expected), (_, got) in zip(golden[section], actual[section]):
+            if expected != got:
+                mismatches += 1
+                print(f"MISMATCH {section}({name!r}): expected {expected!r}, got {got!r}")
+    total = len(golden["parse_folder_name"]) + len(golden["normalize_text"])
+    print(f"golden corpus: {total - mismatches}/{total} identical")
+    return mismatches == 0
+
+
+def throughput(func, inputs, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for value in inputs:
+            func(value)
+    elapsed = time.perf_counter() - start
+    return repeats * len(inputs) / elapsed
+
+
+def main():
+    if "--regenerate" in sys.argv:
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(golden_outputs(previous_parse_folder_name, previous_normalize_text), f,
+                      ensure_ascii=False, indent=1)
+        print(f"wrote {GOLDEN_PATH}")
+        return
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    ok = check_golden()
+    names = CORPUS
+    for label, parse, normalize in (("previous", previous_parse_folder_name, previous_normalize_text),
+                                    ("current", folder_match.parse_folder_name, folder_match.normalize_text)):
+        print(f"{label:<9} parse_folder_name: {throughput(parse, names, repeats):10.0f} names/s   "
+              f"normalize_text: {throughput(normalize, names, repeats):10.0f} texts/s")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Classification and speed of compare_metadata_with_folder against the
+previous nested difflib implementation, on synthetic (title, author, path)
+triples.
+
+Usage: python benchmarks/bench_similarity.py [pairs]
+"""
+import difflib
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import folder_match
+from bench_folder_parser import previous_parse_folder_name, previous_normalize_text
+
+FIRST_NAMES = ["Andrzej", "Stanisław", "Olga", "Marek", "Joanna", "Łukasz", "Wisława", "Jacek",
+               "Remigiusz", "Katarzyna", "Zygmunt", "Henryk", "Małgorzata", "Jakub", "Szczepan"]
+LAST_NAMES = ["Sapkowski", "Lem", "Tokarczuk", "Krajewski", "Chmielewska", "Orbitowski", "Szymborska",
+              "Dukaj", "Mróz", "Bonda", "Miłoszewski", "Sienkiewicz", "Kalicińska", "Żulczyk", "Twardoch"]
+WORDS = ["Ostatnie", "życzenie", "Krew", "elfów", "Solaris", "Cyberiada", "Bieguni", "Heban", "Lód",
+         "Śmierć", "w", "Breslau", "Festung", "Wszystko", "czerwone", "Kult", "Inna", "dusza", "Król",
+         "Morfina", "Pokora", "Zamieć", "Ziarno", "prawdy", "Uwikłanie", "Ślepnąc", "od", "świateł"]
+NARRATORS = ["Krzysztof Gosztyła", "Roch Siemianowski", "Jan Peszek", "Joanna Kulig", "Filip Kosior"]
+
+
+def typo(text, rng):
+    if len(text) < 4:
+        return text
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def synthetic_triples(count, seed=42):
+    rng = random.Random(seed)
+    triples = []
+    for _ in range(count):
+        authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.choice([1, 1, 1, 2]))]
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        folder_authors, folder_title = list(authors), title
+        kind = rng.random()
+        if kind < 0.05:
+            folder_title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+            folder_authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"]
+        elif kind < 0.15:
+            folder_title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        elif kind < 0.30:
+            folder_authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"]
+        elif kind < 0.40:
+            folder_title = typo(folder_title, rng)
+            folder_authors = [typo(a, rng) for a in folder_authors]
+        elif kind < 0.45:
+            folder_authors = [a.split()[-1] for a in folder_authors]
+        folder = f"{', '.join(folder_authors)} - {folder_title}"
+        extra = rng.random()
+        if extra < 0.3:
+            folder += f" czyta {rng.choice(NARRATORS)}"
+        elif extra < 0.4:
+            folder += f" ({rng.randint(1950, 2024)})"
+        elif extra < 0.5:
+            folder += " [audiobook PL]"
+        triples.append((title, ", ".join(authors), f"{folder_authors[0]}/{folder}"))
+    return triples
+
+
+def previous_compare(title, author, folder_path):
+    folder_name = os.path.basename(folder_path)
+    parsed_authors, parsed_title, _ = previous_parse_folder_name(folder_name)
+    if not parsed_title or not parsed_authors:
+        return 'parse_failed'
+    normalized_title = previous_normalize_text(title)
+    normalized_parsed_title = previous_normalize_text(parsed_title)
+    title_similarity = difflib.SequenceMatcher(None, normalized_title, normalized_parsed_title).ratio()
+    title_match = (normalized_parsed_title in normalized_title or
+                   normalized_title in normalized_parsed_title or
+                   title_similarity > 0.7)
+    metadata_authors = [previous_normalize_text(a) for a in author.split(',')]
+    normalized_parsed_authors = [previous_normalize_text(a) for a in parsed_authors]
+    authors_match = False
+    for meta_author in metadata_authors:
+        for folder_author in normalized_parsed_authors:
+            if difflib.SequenceMatcher(None, meta_author, folder_author).ratio() > 0.75:
+                authors_match = True
+                break
+        if authors_match:
+            break
+    if title_match and authors_match:
+        return 'full_match'
+    if title_match:
+        return 'title_only'
+    if authors_match:
+        return 'authors_only'
+    return 'no_match'
+
+
+def current_compare(title, author, folder_path):
+    return folder_match.compare_metadata_with_folder(title, author, folder_path)['match_status']
+
+
+def run(label, func, triples):
+    start = time.perf_counter()
+    statuses = [func(*triple) for triple in triples]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<9} {elapsed:6.2f} s  {len(triples) / elapsed:9.0f} pairs/s  {dict(Counter(statuses))}")
+    return statuses, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    triples = synthetic_triples(count)
+    old, old_time = run("previous", previous_compare, triples)
+    new, new_time = run("current", current_compare, triples)
+    differences = sum(1 for a, b in zip(old, new) if a != b)
+    print(f"classification differences: {differences}   speedup x{old_time / new_time:.1f}")
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == "__main__":
+    main()
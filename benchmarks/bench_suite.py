@@ -0,0 +1,184 @@
+"""End-to-end benchmark suite on a generated library (see synthetic_library.py).
+
+Times loading the catalog and get_items_by_library, comparing every item of a
+library with its folder name, export_items (fresh and incremental), and the
+/, /api/items and /export routes through Flask's test client. Results are written as JSON
+(by default benchmarks/results/<commit>.json) so runs on different commits can
+be compared; pass --baseline with an earlier results file to print the ratios.
+
+Usage: python benchmarks/bench_suite.py [--items N] [--libraries N] [--cover-kb KB]
+                                        [--workers N] [--repeat N] [--output FILE]
+                                        [--baseline FILE] [--skip-app]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.join(HERE, "..")
+sys.path.insert(0, REPO)
+sys.path.insert(0, HERE)
+
+from synthetic_library import write_library
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure(results, name, func, repeat, setup=None):
+    """Runs func repeat times (after setup, which is not timed) and records the timings."""
+    runs = []
+    value = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        value = func()
+        runs.append(time.perf_counter() - start)
+    results[name] = {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+    print(f"{name:<32} min {min(runs) * 1000:10.1f} ms   median {statistics.median(runs) * 1000:10.1f} ms")
+    return value
+
+
+def run_suite(args, tmp):
+    library = write_library(os.path.join(tmp, "library"), args.items, args.libraries, args.cover_kb)
+    # abs_export reads its configuration at import time
+    os.environ["ABS_CSV_DB_PATH"] = library["csv_db"]
+    os.environ["ABS_MEDIA_ROOT"] = library["media"]
+    os.environ.pop("ABS_SQLITE_DB_PATH", None)
+    os.environ.pop("ABS_COMPARE_CACHE_PATH", None)
+    import abs_export
+    import folder_match
+
+    library_name = library["libraries"][0]
+    results = {}
+
+    def cold_catalog():
+        abs_export.catalog = abs_export.Catalog(abs_export.LIBRARIES_CSV, abs_export.LIBRARY_ITEMS_CSV)
+
+    measure(results, "catalog_load", lambda: abs_export.get_library_id_by_name(library_name),
+            args.repeat, setup=cold_catalog)
+    lib_id = abs_export.get_library_id_by_name(library_name)
+    items = measure(results, "get_items_by_library", lambda: abs_export.get_items_by_library(lib_id),
+                    args.repeat)
+
+    triples = [(title, author, path) for _, path, title, author in items]
+    measure(results, "compare_library_serial",
+            lambda: [folder_match.compare_metadata_with_folder(*triple) for triple in triples], args.repeat)
+    measure(results, "compare_library_batch", lambda: folder_match.compare_batch(triples), args.repeat)
+
+    export_root = os.path.join(tmp, "export")
+
+    def clean_export():
+        shutil.rmtree(export_root, ignore_errors=True)
+
+    for workers in sorted({1, args.workers}):
+        measure(results, f"export_items_workers_{workers}",
+                lambda: abs_export.export_items(items, export_root, workers=workers), args.repeat,
+                setup=clean_export)
+    clean_export()
+    abs_export.export_items(items, export_root, workers=args.workers, incremental=True)
+    measure(results, "export_items_incremental",
+            lambda: abs_export.export_items(items, export_root, workers=args.workers, incremental=True),
+            args.repeat)
+
+    if not args.skip_app:
+        run_app_benchmarks(args, results, library_name, export_root, clean_export)
+    return results, library
+
+
+def run_app_benchmarks(args, results, library_name, export_root, clean_export):
+    import app as app_module
+    import export_jobs
+
+    client = app_module.app.test_client()
+
+    def get(url, **query):
+        response = client.get(url, query_string=dict(query, library=library_name))
+        assert response.status_code == 200, response.status_code
+        return response
+
+    def clear_comparisons():
+        app_module.comparison_cache = app_module.ComparisonCache(app_module.comparison_cache.maxsize)
+
+    # The page itself only counts the items; the list comes from /api/items
+    measure(results, "route_index", lambda: get("/"), args.repeat)
+    measure(results, "route_api_items", lambda: get("/api/items", offset=0, limit=100), args.repeat)
+    measure(results, "route_api_items_compare_cold",
+            lambda: get("/api/items", compare_folders="1", offset=0, limit=100), args.repeat,
+            setup=clear_comparisons)
+    measure(results, "route_api_items_compare_warm",
+            lambda: get("/api/items", compare_folders="1", offset=0, limit=100), args.repeat)
+
+    def post_export():
+        response = client.post("/export", data={"library": library_name, "export_path": export_root,
+                                                "select_all_matching": "1"})
+        assert response.status_code == 302, response.status_code
+        job = export_jobs.manager.get(response.headers["Location"].rstrip("/").rsplit("/", 1)[-1])
+        while not job.finished:
+            time.sleep(0.005)
+        assert job.state == "done", job.error_message
+
+    measure(results, "route_export", post_export, args.repeat, setup=clean_export)
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nagainst {baseline_path} (commit {baseline.get('commit')}):")
+    for name, timing in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous and previous["median"] > 0:
+            print(f"{name:<32} x{timing['median'] / previous['median']:6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000, help="items across all libraries")
+    parser.add_argument("--libraries", type=int, default=2)
+    parser.add_argument("--cover-kb", type=float, default=64, help="mean cover.jpg size")
+    parser.add_argument("--workers", type=int, default=8, help="export workers besides the serial run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--skip-app", action="store_true", help="skip the Flask route benchmarks")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    print(f"{args.items} items, {args.libraries} libraries, covers ~{args.cover_kb:g} KB, commit {commit}")
+    with tempfile.TemporaryDirectory() as tmp:
+        results, library = run_suite(args, tmp)
+
+    report = {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"items": args.items, "libraries": args.libraries, "cover_kb": args.cover_kb,
+                   "workers": args.workers, "repeat": args.repeat,
+                   "library_items": library["exportable"][library["libraries"][0]]},
+        "results": results,
+    }
+    output = args.output or os.path.join(HERE, "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {output}")
+    if args.baseline:
+        print_comparison(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Generator of a synthetic Audiobookshelf library for benchmarks.
+
+Writes libraries.csv and libraryItems.csv (as exported from the ABS database)
+and an ABS_MEDIA_ROOT tree with one folder per item ID holding metadata.json
+and cover.jpg. Folder names (relPath) follow the Polish conventions handled by
+folder_match, e.g. "Autor - Tytuł czyta Lektor", with the same mix of matching
+and mismatching names as bench_similarity.
+
+Usage: python benchmarks/synthetic_library.py DEST [items] [libraries] [cover_kb]
+"""
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_similarity import synthetic_triples
+
+# Part of libraryItems.csv rows that the exporter must skip (podcasts, missing items)
+NON_BOOK_FRACTION = 0.02
+MISSING_FRACTION = 0.02
+
+
+def write_library(root, items=5000, libraries=2, cover_kb=64, missing_files=0.05, seed=42):
+    """Creates root/csv_db and root/media and returns a dict with their paths,
+    the library names and the number of exportable items per library.
+
+    cover_kb is the mean cover size (actual sizes vary +-50%); a missing_files
+    fraction of the items lacks cover.jpg, half as many also lack metadata.json."""
+    rng = random.Random(seed)
+    csv_db = os.path.join(root, "csv_db")
+    media = os.path.join(root, "media")
+    os.makedirs(csv_db, exist_ok=True)
+    os.makedirs(media, exist_ok=True)
+
+    library_names = [f"Audiobooki {i + 1}" for i in range(libraries)]
+    with open(os.path.join(csv_db, "libraries.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "displayOrder", "icon", "mediaType"])
+        for i, name in enumerate(library_names):
+            writer.writerow([f"lib-{i}", name, i + 1, "audiobookshelf", "book"])
+
+    # One random block reused for all covers keeps generation fast; the
+    # per-item prefix makes every cover distinct (no accidental dedupe).
+    cover_block = rng.randbytes(int(cover_kb * 1.5 * 1024) + 1)
+    exportable = dict.fromkeys(library_names, 0)
+    triples = synthetic_triples(items, seed)
+    with open(os.path.join(csv_db, "libraryItems.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "ino", "path", "relPath", "mediaId", "mediaType", "isFile", "isMissing",
+                         "isInvalid", "libraryId", "libraryFolderId", "title", "titleIgnorePrefix",
+                         "authorNamesFirstLast", "authorNamesLastFirst", "size"])
+        for i, (title, author, rel_path) in enumerate(triples):
+            item_id = f"item-{i:07d}"
+            lib_index = i % libraries
+            media_type = "podcast" if rng.random() < NON_BOOK_FRACTION else "book"
+            is_missing = 1 if rng.random() < MISSING_FRACTION else 0
+            writer.writerow([item_id, str(rng.getrandbits(40)), f"/audiobooks/{rel_path}", rel_path,
+                             f"media-{i}", media_type, 0, is_missing, 0, f"lib-{lib_index}",
+                             f"folder-{lib_index}", title, title, author, author, rng.randint(10**7, 10**9)])
+            if media_type == "book" and not is_missing:
+                exportable[library_names[lib_index]] += 1
+
+            item_folder = os.path.join(media, item_id)
+            os.makedirs(item_folder, exist_ok=True)
+            roll = rng.random()
+            if roll >= missing_files / 2:
+                with open(os.path.join(item_folder, "metadata.json"), "w", encoding="utf-8") as meta:
+                    json.dump({"title": title, "authors": [a.strip() for a in author.split(",")],
+                               "narrators": [], "description": "Opis " * rng.randint(20, 200)},
+                              meta, ensure_ascii=False)
+            if roll >= missing_files:
+                size = max(1, int(cover_kb * 1024 * rng.uniform(0.5, 1.5)))
+                with open(os.path.join(item_folder, "cover.jpg"), "wb") as cover:
+                    cover.write(i.to_bytes(8, "big"))
+                    cover.write(cover_block[:size])
+
+    return {"csv_db": csv_db, "media": media, "libraries": library_names, "exportable": exportable}
+
+
+# Numeric columns of the ABS tables; everything else is TEXT
+SQLITE_INTEGER_COLUMNS = {"displayOrder", "isFile", "isMissing", "isInvalid", "size"}
+
+
+def write_sqlite(csv_db, db_path):
+    """Copies libraries.csv and libraryItems.csv from csv_db into an SQLite
+    database shaped like absdatabase.sqlite (WAL mode, index on libraryId).
+    Empty text cells become NULL, as ABS stores them (e.g. books without authors)."""
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for table, filename in (("libraries", "libraries.csv"), ("libraryItems", "libraryItems.csv")):
+            with open(os.path.join(csv_db, filename), encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                columns = [f"{name} {'INTEGER' if name in SQLITE_INTEGER_COLUMNS else 'TEXT'}" for name in header]
+                conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+                conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(header))})",
+                                 ([cell if cell != "" else None for cell in row] for row in reader))
+        conn.execute("CREATE INDEX library_items_library_id ON libraryItems (libraryId)")
+        conn.commit()
+    finally:
+        conn.close()
+    return db_path
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    root = sys.argv[1]
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    libraries = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    cover_kb = float(sys.argv[4]) if len(sys.argv) > 4 else 64
+    info = write_library(root, items, libraries, cover_kb)
+    print(f"ABS_CSV_DB_PATH={info['csv_db']}")
+    print(f"ABS_MEDIA_ROOT={info['media']}")
+    for name, count in info["exportable"].items():
+        print(f"{name}: {count} items")
+
+
+if __name__ == "__main__":
+    main()
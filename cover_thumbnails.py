@@ -0,0 +1,95 @@
+import os
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+
+from file_utils import file_sha256, EXPORT_FILE_MODE
+from process_pool import SpawnedPool
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it covers are copied unchanged
+    Image = None
+
+# Longest side (px) of exported covers; 0 copies the original cover.jpg
+COVER_MAX_SIZE = int(os.environ.get("ABS_EXPORT_COVER_SIZE", "0"))
+
+# JPEG quality of resized covers
+COVER_QUALITY = int(os.environ.get("ABS_EXPORT_COVER_QUALITY", "85"))
+
+# Number of worker processes encoding covers (0 = os.cpu_count())
+COVER_PROCESSES = int(os.environ.get("ABS_EXPORT_COVER_PROCESSES", "0")) or os.cpu_count() or 1
+
+# Folder in the export root with resized covers, named by source hash and target size
+COVER_CACHE_NAME = ".cover_cache"
+
+
+def available():
+    return Image is not None
+
+
+def render_cover(source_path, cache_root, max_size, quality=COVER_QUALITY):
+    """Returns (path, cached) of source_path resized to fit max_size x max_size
+    as JPEG, reusing <cache_root>/<hash[:2]>/<hash>-<size>-q<quality>.jpg if an
+    earlier export produced it. Returns (None, False) if the cover already fits,
+    in which case the original is exported as is. Runs in the worker processes."""
+    digest = file_sha256(source_path)
+    cache_dir = os.path.join(cache_root, digest[:2])
+    cache_path = os.path.join(cache_dir, f"{digest}-{max_size}-q{quality}.jpg")
+    if os.path.exists(cache_path):
+        return cache_path, True
+
+    with Image.open(source_path) as image:
+        if max(image.size) <= max_size:
+            return None, False
+        image.draft("RGB", (max_size, max_size))  # lets the JPEG decoder downscale cheaply
+        image = image.convert("RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # Cached covers may be hard-linked into the export (ABS_COPY_STRATEGY=hardlink)
+                os.fchmod(f.fileno(), EXPORT_FILE_MODE)
+                image.save(f, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return cache_path, False
+
+
+class CoverThumbnailer:
+    """Resizes covers for one export on a shared process pool.
+
+    render() is called from the export's worker threads and blocks until a
+    process has produced the cover, so encoding scales across cores while
+    the threads keep copying the other files."""
+
+    def __init__(self, export_path, max_size, quality=COVER_QUALITY):
+        self.cache_root = os.path.join(export_path, COVER_CACHE_NAME)
+        self.max_size = max_size
+        self.quality = quality
+
+    @property
+    def key(self):
+        """Suffix distinguishing the output of these settings, e.g. in the incremental manifest."""
+        return f"{self.max_size}-q{self.quality}"
+
+    def render(self, source_path):
+        """Returns (path, status): the file to export in place of source_path and
+        "resized" or "cached" - or (source_path, None) if the original is exported."""
+        try:
+            future = _pool.get(COVER_PROCESSES).submit(render_cover, source_path, self.cache_root,
+                                                       self.max_size, self.quality)
+            path, cached = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _pool.discard()
+            print(f"Błąd zmniejszania okładki '{source_path}', kopiowanie oryginału: {e}")
+            return source_path, None
+        if path is None:
+            return source_path, None
+        return path, "cached" if cached else "resized"
+
+
+_pool = SpawnedPool()
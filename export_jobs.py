@@ -0,0 +1,352 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import abs_export
+
+# Maximum number of exports running at the same time; further jobs wait in the queue
+MAX_CONCURRENT_JOBS = int(os.environ.get("ABS_EXPORT_MAX_JOBS", "2"))
+
+# Number of finished jobs kept in memory; older ones are read back from JOB_STATE_DIR
+JOB_HISTORY = int(os.environ.get("ABS_EXPORT_JOB_HISTORY", "50"))
+
+# Folder holding the state of every job as <job id>.json, so each server worker
+# process can show the progress and results of jobs run by the others
+JOB_STATE_DIR = os.environ.get("ABS_JOB_STATE_DIR", os.path.join(tempfile.gettempdir(), "abs_export_jobs"))
+
+# Seconds between two writes of a running job's progress to its state file
+JOB_STATE_INTERVAL = float(os.environ.get("ABS_JOB_STATE_INTERVAL", "1"))
+
+# State files of jobs not updated for this many seconds are removed
+JOB_STATE_MAX_AGE = int(os.environ.get("ABS_JOB_STATE_MAX_AGE", str(7 * 24 * 3600)))
+
+
+class ExportJob:
+    """A single export running in the background, with live progress counters."""
+
+    def __init__(self, items, export_path, library=None, compare_folders=False, **export_options):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.items_total = len(items)
+        self.export_path = export_path
+        self.library = library
+        self.compare_folders = compare_folders
+        # Keyword arguments passed through to abs_export.export_items
+        self.export_options = export_options
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = 0
+        self.files_copied = 0
+        self.errors = 0
+        self.error_message = None
+        self.results = None
+        self.counts = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        # JobStore the state is written to (set by JobManager.submit)
+        self.store = None
+        self._saved_at = 0.0
+        self._save_lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.state in ("done", "failed")
+
+    @property
+    def has_errors(self):
+        if self.state == "failed":
+            return True
+        return any(not success for _, success, _ in self.results or [])
+
+    def _on_result(self, item_id, success, details):
+        with self._lock:
+            self.done += 1
+            self.files_copied += int(bool(details.get("metadata_copied"))) + int(bool(details.get("cover_copied")))
+            if details.get("overall_class") == "error":
+                self.errors += 1
+        if time.monotonic() - self._saved_at >= JOB_STATE_INTERVAL:
+            self.save(wait=False)
+
+    def run(self):
+        self.state = "running"
+        self.started_at = time.time()
+        self.save()
+        try:
+            self.results, self.counts = abs_export.export_items(
+                self.items, self.export_path, on_result=self._on_result, **self.export_options)
+            self.state = "done"
+        except Exception as e:
+            print(f"Błąd zadania eksportu {self.id}: {e}")
+            self.error_message = str(e)
+            self.state = "failed"
+        finally:
+            self.finished_at = time.time()
+            self.save()
+            self._done.set()
+
+    def fail(self, message):
+        """Marks a job that will never run (e.g. cancelled at shutdown) as failed."""
+        self.error_message = message
+        self.state = "failed"
+        self.finished_at = time.time()
+        self.save()
+        self._done.set()
+
+    def save(self, wait=True):
+        """Writes the job's state to its store, if any. With wait=False the write
+        is skipped while another thread is writing it."""
+        if self.store is None:
+            return
+        if not self._save_lock.acquire(blocking=wait):
+            return
+        try:
+            self._saved_at = time.monotonic()
+            self.store.save(self)
+        finally:
+            self._save_lock.release()
+
+    def to_state(self):
+        """Returns the job as a JSON-serializable dict (see from_state)."""
+        with self._lock:
+            done, files_copied, errors = self.done, self.files_copied, self.errors
+        return {
+            "id": self.id, "state": self.state, "library": self.library,
+            "export_path": self.export_path, "compare_folders": self.compare_folders,
+            "export_options": self.export_options, "items_total": self.items_total,
+            "created_at": self.created_at, "started_at": self.started_at,
+            "finished_at": self.finished_at, "done": done, "files_copied": files_copied,
+            "errors": errors, "error_message": self.error_message,
+            "results": self.results, "counts": self.counts,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuilds a read-only copy of a job (without its items) from to_state()."""
+        job = cls([], state["export_path"], library=state["library"],
+                  compare_folders=state["compare_folders"], **state["export_options"])
+        for name in ("id", "state", "items_total", "created_at", "started_at", "finished_at",
+                     "done", "files_copied", "errors", "error_message", "counts"):
+            setattr(job, name, state[name])
+        if state["results"] is not None:
+            job.results = [tuple(result) for result in state["results"]]
+        if job.finished:
+            job._done.set()
+        return job
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def progress(self):
+        """Returns a JSON-serializable snapshot of the job's progress."""
+        with self._lock:
+            done, files_copied, errors = self.done, self.files_copied, self.errors
+        elapsed = 0.0
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "id": self.id,
+            "state": self.state,
+            "library": self.library,
+            "export_path": self.export_path,
+            "items_total": self.items_total,
+            "items_done": done,
+            "files_copied": files_copied,
+            "errors": errors,
+            "error_message": self.error_message,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            "files_per_second": round(files_copied / elapsed, 2) if elapsed > 0 else 0.0,
+            "counts": self.counts,
+        }
+
+
+class JobStore:
+    """Job states shared by the server's worker processes, one JSON file per
+    job in root, each replaced atomically on update.
+
+    Every process that saves jobs holds an flock on its own owner-<token>.lock
+    file until it exits; an unfinished job whose owner lock is free was left
+    behind by a process that died and is reported as failed."""
+
+    def __init__(self, root=JOB_STATE_DIR):
+        self.root = root
+        # (pid, token, locked file) of this process's owner file
+        self._owner = None
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _owner_path(self, token):
+        return os.path.join(self.root, f"owner-{token}.lock")
+
+    def _owner_token(self):
+        try:
+            import fcntl
+        except ImportError:  # non-POSIX: owners are not tracked
+            return None
+        with self._lock:
+            # A forked worker gets its own owner file instead of the master's
+            if self._owner is None or self._owner[0] != os.getpid():
+                token = uuid.uuid4().hex
+                fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".owner-", suffix=".tmp")
+                f = os.fdopen(fd, 'wb')
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                # Renamed only once locked, so prune() never sees it unlocked
+                os.replace(tmp_path, self._owner_path(token))
+                self._owner = (os.getpid(), token, f)
+            return self._owner[1]
+
+    def _owner_alive(self, token):
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        if token is None:
+            return True
+        try:
+            f = open(self._owner_path(token), 'rb')
+        except FileNotFoundError:
+            return False
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            return False
+
+    def save(self, job):
+        """Writes job.to_state() to <root>/<job id>.json via a temp file + rename."""
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            state = dict(job.to_state(), owner=self._owner_token())
+            data = json.dumps(state, ensure_ascii=False).encode('utf-8')
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".job-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(job.id))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            print(f"Błąd zapisu stanu zadania eksportu {job.id}: {e}")
+
+    def load(self, job_id):
+        """Returns a read-only copy of a job saved by any process, or None."""
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'rb') as f:
+                state = json.loads(f.read())
+            job = ExportJob.from_state(state)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Błąd odczytu stanu zadania eksportu {job_id}: {e}")
+            return None
+        if not job.finished and not self._owner_alive(state.get("owner")):
+            job.fail("Eksport przerwany - proces serwera, który go wykonywał, zakończył działanie.")
+        return job
+
+    def prune(self, max_age=JOB_STATE_MAX_AGE):
+        """Removes states not updated for max_age seconds and the owner files
+        of processes that have exited."""
+        cutoff = time.time() - max_age
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                elif (entry.name.startswith("owner-") and entry.name.endswith(".lock")
+                      and not self._owner_alive(entry.name[len("owner-"):-len(".lock")])):
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+class JobManager:
+    """Runs export jobs on a bounded pool of background threads and keeps
+    a limited history of finished jobs. Job states are also written to a
+    JobStore, so get() finds jobs run by other server processes too."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, history=JOB_HISTORY, store=None):
+        self.history = history
+        self.store = store if store is not None else JobStore()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent),
+                                            thread_name_prefix="export-job")
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        self.store.prune()
+        job.store = self.store
+        job.save()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+            if self._closed:
+                job.fail("Serwer jest zamykany - eksport nie został uruchomiony.")
+                return job
+            future = self._executor.submit(job.run)
+            self._futures[job.id] = (job, future)
+        future.add_done_callback(lambda _: self._forget(job.id))
+        return job
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def shutdown(self, timeout=None):
+        """Stops accepting jobs, cancels the queued ones and waits up to timeout
+        seconds (None = indefinitely) for running exports to finish.
+        Returns the jobs still running when the timeout expired."""
+        with self._lock:
+            self._closed = True
+            pending = list(self._futures.values())
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        unfinished = []
+        for job, future in pending:
+            if future.cancelled():
+                job.fail("Eksport anulowany - serwer został zamknięty przed jego rozpoczęciem.")
+                continue
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.wait(remaining):
+                unfinished.append(job)
+        return unfinished
+
+    def get(self, job_id):
+        """Returns the job, or a read-only copy of its saved state if another
+        process runs it (or it left this process's history); None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self.store.load(job_id)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+
+manager = JobManager()
@@ -0,0 +1,23 @@
+import hashlib
+import os
+
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Returns the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Mode of files created through tempfile.mkstemp (which uses 0600) once they
+# are exported: what open() would give them. Read once at import, because
+# changing the umask to read it is not thread-safe.
+EXPORT_FILE_MODE = 0o666 & ~_current_umask()
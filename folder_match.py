@@ -0,0 +1,253 @@
+import os
+import re
+import difflib
+import pickle
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from process_pool import SpawnedPool
+
+# Number of worker processes for compare_batch (0 = os.cpu_count())
+COMPARE_PROCESSES = int(os.environ.get("ABS_COMPARE_PROCESSES", "0")) or os.cpu_count() or 1
+
+# Below this many items compare_batch runs in-process, where pool overhead would dominate
+COMPARE_POOL_MIN_ITEMS = int(os.environ.get("ABS_COMPARE_POOL_MIN_ITEMS", "5000"))
+
+# Folder-name cleanup patterns, applied in this order by parse_folder_name
+_NARRATOR_RE = re.compile(r'czyta .*?(?=\[|$)', re.IGNORECASE)
+_BRACKETS_RE = re.compile(r'\[.*?\]')
+_SERIES_RE = re.compile(r'(?i)cykl .*?(?= -|$)')
+_VOLUME_RE = re.compile(r'(?i)tom \d+')
+_AUTHOR_TITLE_RE = re.compile(r'^(.+?)\s*-\s*(.+?)(?:\s*\((\d{4})\))?$')
+
+# Podstawowe mapowanie polskich znaków. Applied after lower(), so only the
+# lowercase letters are needed; a short replace() chain measures faster than
+# str.translate for these short, mostly-ASCII strings.
+_TRANSLITERATION = (
+    ('ą', 'a'), ('ć', 'c'), ('ę', 'e'), ('ł', 'l'), ('ń', 'n'),
+    ('ó', 'o'), ('ś', 's'), ('ź', 'z'), ('ż', 'z'),
+)
+
+def parse_folder_name(folder_name):
+    """
+    Parsuje nazwę folderu w formacie: 'Autor - Tytuł' z dopiskami typu 'czyta', 'tom', '[audiobook]'
+    """
+    # Each cleanup regex only runs when its literal prefix occurs in the
+    # (current) name, so most names go straight to the final match.
+    cleaned = folder_name
+    lowered = cleaned.lower()
+
+    # Usuń część po 'czyta ...'
+    if 'czyta ' in lowered:
+        cleaned = _NARRATOR_RE.sub('', cleaned)
+
+    # Usuń nawiasy kwadratowe i ich zawartość, np. [audiobook PL]
+    if '[' in cleaned:
+        cleaned = _BRACKETS_RE.sub('', cleaned)
+
+    if cleaned is not folder_name:
+        lowered = cleaned.lower()
+
+    # Usuń dopiski typu 'cykl ...' i 'tom X'
+    if 'cykl ' in lowered:
+        cleaned = _SERIES_RE.sub('', cleaned)
+        lowered = cleaned.lower()
+    if 'tom ' in lowered:
+        cleaned = _VOLUME_RE.sub('', cleaned)
+
+    cleaned = cleaned.strip()
+
+    # Dopasuj: Autor - Tytuł (opcjonalnie z rokiem)
+    match = _AUTHOR_TITLE_RE.match(cleaned)
+
+    if match:
+        authors_str, title, year = match.groups()
+        authors = [a.strip() for a in authors_str.split(',')]
+        return authors, title.strip(), year
+
+    return None, None, None
+
+def parse_folder_series(folder_name):
+    """
+    Zwraca (seria, tom) z dopisków 'cykl ...' i 'tom X' w nazwie folderu, np.
+    'Autor - Tytuł cykl Wiedźmin tom 2' -> ('Wiedźmin', '2'). Brakujące części to None.
+    """
+    cleaned = folder_name
+    lowered = cleaned.lower()
+    if 'cykl ' not in lowered and 'tom ' not in lowered:
+        return None, None
+    if 'czyta ' in lowered:
+        cleaned = _NARRATOR_RE.sub('', cleaned)
+    if '[' in cleaned:
+        cleaned = _BRACKETS_RE.sub('', cleaned)
+
+    volume_match = _VOLUME_RE.search(cleaned)
+    volume = volume_match.group()[4:].strip() if volume_match else None
+
+    series = None
+    series_match = _SERIES_RE.search(cleaned)
+    if series_match:
+        series = _VOLUME_RE.sub('', series_match.group()[5:]).strip(' ,.-') or None
+    return series, volume
+
+def normalize_text(text):
+    """Normalizuje tekst do porównania - usuwa diakrytyki, zmienia na małe litery"""
+    if not text:
+        return ""
+    normalized = text.lower()
+    if normalized.isascii():
+        return normalized
+    for old, new in _TRANSLITERATION:
+        normalized = normalized.replace(old, new)
+    return normalized
+
+# Similarity thresholds used by compare_metadata_with_folder (ratio must be strictly greater)
+TITLE_THRESHOLD = 0.7
+AUTHOR_THRESHOLD = 0.75
+
+class DifflibSimilarity:
+    """Similarity engine based on difflib.SequenceMatcher.ratio().
+
+    exceeds() gives exactly the same answer as ratio(a, b) > threshold, but
+    first checks cheap upper bounds of the ratio (the length bound used by
+    real_quick_ratio and the character-multiset bound used by quick_ratio),
+    so the expensive matching-blocks computation only runs for plausible pairs."""
+
+    def ratio(self, a, b):
+        return difflib.SequenceMatcher(None, a, b).ratio()
+
+    def exceeds(self, a, b, threshold):
+        if a == b:
+            return 1.0 > threshold
+        total = len(a) + len(b)
+        # real_quick_ratio: matches can't exceed the shorter string
+        if 2.0 * min(len(a), len(b)) / total <= threshold:
+            return False
+        # quick_ratio: matches can't exceed the common character multiset
+        common = sum((Counter(a) & Counter(b)).values())
+        if 2.0 * common / total <= threshold:
+            return False
+        return self.ratio(a, b) > threshold
+
+similarity_engine = DifflibSimilarity()
+
+def set_similarity_engine(engine):
+    """Replaces the engine used by compare_metadata_with_folder. An engine
+    provides ratio(a, b) and exceeds(a, b, threshold)."""
+    global similarity_engine
+    similarity_engine = engine
+
+# ZMODYFIKOWANA FUNKCJA PORÓWNANIA
+def compare_metadata_with_folder(title, author, folder_path):
+    """
+    Porównuje metadane z nazwą folderu z większą elastycznością.
+    Zwraca dict z wynikami porównania.
+    """
+    if not folder_path:
+        return {
+            'folder_parsed': False, 'match_status': 'no_path', 'folder_name': '',
+            'parsed_title': '', 'parsed_authors': []
+        }
+
+    folder_name = os.path.basename(folder_path)
+    parsed_authors, parsed_title, parsed_year = parse_folder_name(folder_name)
+
+    if not parsed_title or not parsed_authors:
+        return {
+            'folder_parsed': False, 'match_status': 'parse_failed', 'folder_name': folder_name,
+            'parsed_title': '', 'parsed_authors': []
+        }
+
+    # Porównanie tytułów (zawieranie sprawdzamy przed kosztownym podobieństwem)
+    normalized_title = normalize_text(title)
+    normalized_parsed_title = normalize_text(parsed_title)
+    title_match = (normalized_parsed_title in normalized_title or 
+                   normalized_title in normalized_parsed_title or 
+                   similarity_engine.exceeds(normalized_title, normalized_parsed_title, TITLE_THRESHOLD))
+
+    # Porównanie autorów z wykorzystaniem podobieństwa tekstu
+    metadata_authors = dict.fromkeys(normalize_text(a) for a in author.split(','))
+    normalized_parsed_authors = dict.fromkeys(normalize_text(a) for a in parsed_authors)
+
+    authors_match = any(
+        similarity_engine.exceeds(meta_author, folder_author, AUTHOR_THRESHOLD)
+        for meta_author in metadata_authors
+        for folder_author in normalized_parsed_authors
+    )
+
+    # Określenie wyniku
+    if title_match and authors_match:
+        match_status = 'full_match'
+    elif title_match:
+        match_status = 'title_only'
+    elif authors_match:
+        match_status = 'authors_only'
+    else:
+        match_status = 'no_match'
+
+    return {
+        'folder_parsed': True,
+        'match_status': match_status,
+        'folder_name': folder_name,
+        'parsed_title': parsed_title,
+        'parsed_authors': parsed_authors
+    }
+
+
+def _compare_chunk(triples):
+    return [compare_metadata_with_folder(title, author, path) for title, author, path in triples]
+
+_pool = SpawnedPool()
+
+def _picklable(engine):
+    try:
+        pickle.dumps(engine)
+        return True
+    except Exception:
+        return False
+
+def shutdown_pool():
+    """Stops the process pool (it is recreated on the next large batch), e.g.
+    before a preforking server forks its workers."""
+    _pool.shutdown()
+
+def compare_batch(triples, processes=None, chunksize=None, min_pool_items=None):
+    """Runs compare_metadata_with_folder for a list of (title, author, path)
+    tuples and returns the result dicts in the same order.
+
+    Large batches are split into chunks and classified across a process pool;
+    batches smaller than min_pool_items (or with a single process) run in-process."""
+    triples = list(triples)
+    metrics.compare_items_total.inc(len(triples))
+    with metrics.compare_batch_seconds.time():
+        return _compare_batch(triples, processes, chunksize, min_pool_items)
+
+def _compare_batch(triples, processes, chunksize, min_pool_items):
+    if processes is None:
+        processes = COMPARE_PROCESSES
+    if min_pool_items is None:
+        min_pool_items = COMPARE_POOL_MIN_ITEMS
+    engine = similarity_engine
+    if processes <= 1 or len(triples) < min_pool_items:
+        return _compare_chunk(triples)
+    if not _picklable(engine):
+        # The workers could not receive the engine and would compare differently
+        return _compare_chunk(triples)
+
+    if chunksize is None:
+        # A few chunks per worker keeps them balanced without much IPC overhead
+        chunksize = max(1, -(-len(triples) // (processes * 4)))
+    chunks = [triples[i:i + chunksize] for i in range(0, len(triples), chunksize)]
+    try:
+        results = []
+        # Workers get the engine installed by the initializer
+        pool = _pool.get(processes, initializer=set_similarity_engine, initargs=(engine,))
+        for chunk_results in pool.map(_compare_chunk, chunks):
+            results.extend(chunk_results)
+        return results
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _pool.discard()
+        print(f"Błąd porównywania w puli procesów, porównanie lokalne: {e}")
+        return _compare_chunk(triples)
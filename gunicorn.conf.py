@@ -0,0 +1,60 @@
+"""gunicorn settings for serving the exporter in production:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported and warmed up (catalog, search index, library lists) once
+in the master process before the workers are forked, so the workers share that
+memory copy-on-write. On SIGTERM each worker stops accepting requests and waits
+for its running exports before exiting.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# Exports run in threads of the worker that received them; their progress and
+# results are shared with the other workers through ABS_JOB_STATE_DIR
+workers = int(os.environ.get("ABS_WEB_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("ABS_WEB_THREADS", "8"))
+
+preload_app = True
+
+# Seconds a stopping worker gets to finish its running exports before it is killed
+graceful_timeout = int(os.environ.get("ABS_SHUTDOWN_TIMEOUT", "600"))
+
+# Downloads of large .tar archives are streamed for a long time
+timeout = int(os.environ.get("ABS_WEB_TIMEOUT", "300"))
+
+accesslog = "-"
+
+
+def when_ready(server):
+    import app
+
+    server.log.info("Wczytywanie katalogu przed uruchomieniem workerów...")
+    if not app.warm_up():
+        server.log.warning("Katalog niedostępny - /ready zwraca 503 do czasu jego wczytania.")
+        return
+    # Objects loaded so far are never freed; keeping the collector away from
+    # them stops it from touching (and so copying) the shared pages
+    gc.freeze()
+    server.log.info("Katalog wczytany.")
+
+
+def post_worker_init(worker):
+    import app
+
+    # Without preload_app (or if the catalog was missing) the master did not
+    # warm up; do it in the background so the worker starts serving /ready
+    if not app._ready.is_set():
+        app.start_warm_up()
+
+
+def worker_exit(server, worker):
+    import export_jobs
+
+    # Leave a few seconds of the graceful timeout for the worker to exit
+    unfinished = export_jobs.manager.shutdown(timeout=max(0, graceful_timeout - 5))
+    for job in unfinished:
+        server.log.warning("Eksport %s nie zakończył się przed zamknięciem serwera.", job.id)
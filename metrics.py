@@ -0,0 +1,163 @@
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Set ABS_METRICS=0 to turn the timing instrumentation into no-ops
+METRICS_ENABLED = os.environ.get("ABS_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Histogram bucket upper bounds in seconds, from a single fast local copy
+# up to a whole-library comparison or a slow network share
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def render(self):
+        return [f"{self.name} {_format_value(self._value)}"]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (usually durations in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """Observes the duration of the with-block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def render(self):
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {_format_value(total)}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class Registry:
+    """Named collection of metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return f"{value:.1f}"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile (fraction in 0..1) of a list of numbers, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+registry = Registry()
+
+# Stage timings: CSV loading and folder comparison are CPU-bound, directory
+# creation and file copies are I/O-bound on the export destination
+catalog_load_seconds = registry.histogram(
+    "abs_catalog_load_seconds", "Time spent parsing libraries.csv and libraryItems.csv.")
+compare_batch_seconds = registry.histogram(
+    "abs_compare_batch_seconds", "Time spent comparing a batch of items with their folder names.")
+compare_items_total = registry.counter(
+    "abs_compare_items_total", "Items compared with their folder names.")
+export_mkdir_seconds = registry.histogram(
+    "abs_export_mkdir_seconds", "Time spent creating an item's destination folder.")
+export_copy_seconds = registry.histogram(
+    "abs_export_copy_seconds", "Time spent copying a single file into the export.")
+export_item_seconds = registry.histogram(
+    "abs_export_item_seconds", "Time spent exporting a single item (all its files).")
+export_bytes_total = registry.counter(
+    "abs_export_bytes_total", "Bytes copied into exports.")
+export_files_total = registry.counter(
+    "abs_export_files_total", "Files copied into exports.")
+exports_total = registry.counter(
+    "abs_exports_total", "Finished export runs.")
@@ -0,0 +1,42 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class SpawnedPool:
+    """A process pool created on first use and shared by all threads.
+
+    Workers are spawned rather than forked, since the web server is threaded."""
+
+    def __init__(self):
+        self._executor = None
+        self._key = None
+        self._lock = threading.Lock()
+
+    def get(self, processes, initializer=None, initargs=()):
+        """Returns the pool, (re)creating it for a different size or initializer."""
+        key = (processes, initializer, initargs)
+        with self._lock:
+            if self._executor is None or self._key != key:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=processes,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=initializer, initargs=initargs)
+                self._key = key
+            return self._executor
+
+    def discard(self):
+        """Drops a broken pool (a worker died) so the next call starts a new one."""
+        self._close(wait=False)
+
+    def shutdown(self):
+        """Stops the workers; the pool is recreated on next use."""
+        self._close(wait=True)
+
+    def _close(self, wait):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._key = None
@@ -0,0 +1,114 @@
+import re
+import threading
+from bisect import bisect_left
+
+from folder_match import normalize_text
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def tokenize(text):
+    """Splits text into normalized (lowercase, Polish diacritics folded) word tokens."""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """Token index over the titles and authors of all catalog items.
+
+    A query matches an item when every query token occurs in one of the item's
+    tokens: tokens of three or more characters are looked up anywhere inside a
+    word through a trigram index of the vocabulary, shorter ones as word prefixes
+    through the sorted vocabulary. The index follows catalog.version and, when
+    the catalog reloads, only re-tokenizes items whose title/author changed."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._version = None
+        self._docs = {}          # item id -> (title, author, tokens)
+        self._postings = {}      # token -> set of item ids
+        self._trigrams = {}      # trigram -> set of tokens
+        self._sorted_tokens = None
+        self._lock = threading.Lock()
+
+    def ensure_current(self):
+        self.catalog.refresh()
+        if self._version == self.catalog.version:
+            return
+        with self._lock:
+            version = self.catalog.version
+            if self._version != version:
+                self._sync(self.catalog.iter_items())
+                self._version = version
+
+    def _sync(self, entries):
+        seen = set()
+        for _, (item_id, _, title, author) in entries:
+            key = str(item_id)
+            seen.add(key)
+            doc = self._docs.get(key)
+            if doc is not None and doc[0] == title and doc[1] == author:
+                continue
+            if doc is not None:
+                self._remove(key, doc[2])
+            tokens = frozenset(tokenize(title) + tokenize(author))
+            self._docs[key] = (title, author, tokens)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    for trigram in _trigrams(token):
+                        self._trigrams.setdefault(trigram, set()).add(token)
+                    self._sorted_tokens = None
+                postings.add(key)
+        for key in [key for key in self._docs if key not in seen]:
+            self._remove(key, self._docs.pop(key)[2])
+
+    def _remove(self, key, tokens):
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(key)
+            if not postings:
+                del self._postings[token]
+                for trigram in _trigrams(token):
+                    owners = self._trigrams.get(trigram)
+                    if owners is not None:
+                        owners.discard(token)
+                        if not owners:
+                            del self._trigrams[trigram]
+                self._sorted_tokens = None
+
+    def _matching_tokens(self, query_token):
+        if len(query_token) >= 3:
+            candidate_sets = [self._trigrams.get(trigram, ()) for trigram in _trigrams(query_token)]
+            candidate_sets.sort(key=len)
+            candidates = set(candidate_sets[0]).intersection(*candidate_sets[1:])
+            return [token for token in candidates if query_token in token]
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = []
+        index = bisect_left(self._sorted_tokens, query_token)
+        while index < len(self._sorted_tokens) and self._sorted_tokens[index].startswith(query_token):
+            tokens.append(self._sorted_tokens[index])
+            index += 1
+        return tokens
+
+    def search(self, query):
+        """Returns the set of matching item IDs, or None for an empty query (everything matches)."""
+        query_tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not query_tokens:
+            return None
+        self.ensure_current()
+        with self._lock:
+            result = None
+            for query_token in query_tokens:
+                ids = set()
+                for token in self._matching_tokens(query_token):
+                    ids |= self._postings[token]
+                result = ids if result is None else result & ids
+                if not result:
+                    break
+            return result